@@ -1,16 +1,189 @@
 import os
-import yaml
+import sys
+import json
+import time
+import pickle
+import hashlib
+from collections import deque
+from endpoint_record import EndpointRecord, field_pairs
+from metrics import count, observe
 
-def load_openapi_specifications(directory):
-    specs = []
-    for filename in os.listdir(directory):
-        if filename.endswith(".yaml"):
+SPEC_EXTENSIONS = (".yaml", ".yml", ".json")
+# Parsed specs and index metadata both live here, relative to the working
+# directory; cache files are keyed by each spec's absolute path.
+SPEC_CACHE_DIR = ".spec_cache"
+SPEC_CACHE_VERSION = 5
+
+def yaml_loader():
+    # PyYAML is only imported once a spec actually has to be parsed; specs
+    # served from the cache never need it.
+    import yaml
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+def load_spec_document(filepath):
+    with open(filepath, 'rb') as f:
+        if filepath.endswith(".json"):
+            return json.load(f)
+        import yaml
+        return yaml.load(f, Loader=yaml_loader())
+
+def parse_spec_file(filepath):
+    # Runs in a worker process: parse the spec and extract its endpoints so
+    # both can be stored in the on-disk cache. Endpoints travel back and are
+    # cached as compact EndpointRecord bytes.
+    spec = load_spec_document(filepath)
+    if not isinstance(spec, dict) or 'paths' not in spec:
+        return None, [], {}
+    schema_cache = SchemaCache(spec)
+    endpoints = [record.to_bytes() for record in iter_endpoints(spec, schema_cache, os.path.basename(filepath))]
+    return spec, endpoints, schema_cache.stats()
+
+def file_digest(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def spec_cache_path(cache_dir, filepath):
+    key = hashlib.sha1(os.path.abspath(filepath).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"{key}.pickle")
+
+def read_spec_cache(cache_file):
+    try:
+        with open(cache_file, 'rb') as f:
+            entry = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(entry, dict) or entry.get('version') != SPEC_CACHE_VERSION:
+        return None
+    return entry
+
+def write_spec_cache(cache_file, entry):
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"Could not write spec cache {cache_file}: {e}")
+
+def lookup_spec_cache(filepath, cache_file):
+    # Returns the cached entry for an unchanged file, or (None, digest) when
+    # the file has to be parsed.
+    stat = os.stat(filepath)
+    entry = read_spec_cache(cache_file)
+    if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+        return entry, None
+    digest = file_digest(filepath)
+    if entry and entry['sha256'] == digest:
+        # Touched but unchanged: refresh the stat key without re-parsing.
+        entry['size'], entry['mtime'] = stat.st_size, stat.st_mtime_ns
+        write_spec_cache(cache_file, entry)
+        return entry, None
+    return None, digest
+
+def parsed_spec_entry(filename, filepath, digest, result):
+    spec, endpoints, stats = result
+    stat = os.stat(filepath)
+    if spec is not None:
+        print(f"OpenAPI specification {filename} parsed: {len(endpoints)} endpoints, "
+              f"schema cache {stats['hits']} hits / {stats['misses']} misses / {stats['cycles']} cycles cut.")
+        count('schema_refs_resolved', stats['hits'], cache='hit')
+        count('schema_refs_resolved', stats['misses'], cache='miss')
+    return {
+        'version': SPEC_CACHE_VERSION,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'sha256': digest,
+        'spec': spec,
+        'endpoints': endpoints,
+    }
+
+def iter_openapi_specifications(directory, use_cache=True, cache_dir=None, max_workers=None):
+    # Yields (filename, spec, endpoint records) one file at a time, in name order.
+    # Changed files are parsed on a process pool at most max_workers files
+    # ahead of the consumer, so memory is bounded by a few specs rather than
+    # the whole catalog.
+    if cache_dir is None:
+        cache_dir = SPEC_CACHE_DIR
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    filenames = sorted(f for f in os.listdir(directory) if f.endswith(SPEC_EXTENSIONS))
+    executor = None
+    queued = deque()
+    counts = {'cached': 0, 'parsed': 0}
+
+    def finish(filename, filepath, entry, digest, cache_file, future):
+        started = time.perf_counter()
+        source = 'cache' if entry is not None else 'parsed'
+        if entry is None:
+            try:
+                result = future.result() if future is not None else parse_spec_file(filepath)
+            except Exception as e:
+                # One broken file must not stop the rest of the catalog loading.
+                print(f"Skipping {filename}: could not parse it ({type(e).__name__}: {e}).")
+                count('specs_failed')
+                return None
+            entry = parsed_spec_entry(filename, filepath, digest, result)
+            if use_cache:
+                write_spec_cache(cache_file, entry)
+            if entry['spec'] is not None:
+                counts['parsed'] += 1
+        elif entry['spec'] is not None:
+            counts['cached'] += 1
+            print(f"OpenAPI specification {filename} loaded from cache.")
+        if entry['spec'] is None:
+            print(f"Skipping {filename}: not an OpenAPI specification.")
+            return None
+        observe('spec_load', time.perf_counter() - started, source=source)
+        count('specs_loaded', source=source)
+        count('endpoints_extracted', len(entry['endpoints']))
+        return filename, entry['spec'], entry['endpoints']
+
+    def records(encoded):
+        shared = {}
+        for data in encoded:
+            yield EndpointRecord.from_bytes(data, shared)
+
+    try:
+        for filename in filenames:
             filepath = os.path.join(directory, filename)
-            print(f"Loading OpenAPI specification from {filepath}...")
-            with open(filepath) as f:
-                spec = yaml.safe_load(f)
-                specs.append(spec)
-            print(f"OpenAPI specification {filename} loaded successfully.")
+            cache_file = spec_cache_path(cache_dir, filepath) if use_cache else None
+            entry, digest = lookup_spec_cache(filepath, cache_file) if use_cache else (None, None)
+            future = None
+            if entry is None and max_workers > 1:
+                if executor is None:
+                    from concurrent.futures import ProcessPoolExecutor
+                    print(f"Parsing changed OpenAPI specifications using {yaml_loader().__name__} on {max_workers} processes...")
+                    executor = ProcessPoolExecutor(max_workers=max_workers)
+                future = executor.submit(parse_spec_file, filepath)
+            queued.append((filename, filepath, entry, digest, cache_file, future))
+            while len(queued) > max_workers:
+                item = finish(*queued.popleft())
+                if item is not None:
+                    yield item[0], item[1], records(item[2])
+        while queued:
+            item = finish(*queued.popleft())
+            if item is not None:
+                yield item[0], item[1], records(item[2])
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    print(f"Loaded {counts['cached'] + counts['parsed']} OpenAPI specification(s): "
+          f"{counts['cached']} from cache, {counts['parsed']} parsed.")
+
+def load_openapi_specifications(directory, use_cache=True, cache_dir=None, max_workers=None, with_endpoints=False):
+    specs = []
+    endpoints = []
+    for filename, spec, spec_endpoints in iter_openapi_specifications(directory, use_cache, cache_dir, max_workers):
+        specs.append(spec)
+        endpoints.extend(spec_endpoints)
+    if with_endpoints:
+        return specs, endpoints
     return specs
 
 def resolve_ref(ref, spec):
@@ -20,59 +193,173 @@ def resolve_ref(ref, spec):
         resolved = resolved.get(part, {})
     return resolved
 
-def extract_properties(schema, spec):
+# Per-spec cache of flattened $ref schemas: each ref pointer is flattened once
+# and shared by every response and request body that points at it. Refs already
+# being flattened further up the stack are cut off so recursive schemas end.
+class SchemaCache:
+    def __init__(self, spec):
+        self.spec = spec
+        self.ref_targets = {}
+        self.flattened = {}
+        self.hits = 0
+        self.misses = 0
+        self.cycles = 0
+        self._resolving = []
+        self._cuts = []
+        # Field tuples shared between the endpoint records of this spec.
+        self.shared = {}
+        # Pre-split lookup table for the common '#/components/<kind>/<name>'
+        # and Swagger 2 '#/definitions/<name>' pointers.
+        for kind, objects in (spec.get('components') or {}).items():
+            if isinstance(objects, dict):
+                for name, target in objects.items():
+                    self.ref_targets[f"#/components/{kind}/{name}"] = target
+        for name, target in (spec.get('definitions') or {}).items():
+            self.ref_targets[f"#/definitions/{name}"] = target
+
+    def resolve(self, ref):
+        if ref not in self.ref_targets:
+            self.ref_targets[ref] = resolve_ref(ref, self.spec)
+        return self.ref_targets[ref]
+
+    def flatten(self, ref):
+        if ref in self.flattened:
+            self.hits += 1
+            return self.flattened[ref]
+        if ref in self._resolving:
+            self.cycles += 1
+            self._cuts[-1].add(ref)
+            return {}
+        self.misses += 1
+        self._resolving.append(ref)
+        self._cuts.append(set())
+        try:
+            properties = extract_properties(self.resolve(ref), self.spec, self)
+        finally:
+            self._resolving.pop()
+            cuts = self._cuts.pop()
+        cuts.discard(ref)
+        if self._cuts:
+            self._cuts[-1].update(cuts)
+        # Only memoize complete results; a schema cut short by a cycle through
+        # one of its ancestors would otherwise be cached without their fields.
+        if not cuts:
+            self.flattened[ref] = properties
+        return properties
+
+    def stats(self):
+        return {
+            'refs': len(self.flattened),
+            'hits': self.hits,
+            'misses': self.misses,
+            'cycles': self.cycles,
+        }
+
+def extract_properties(schema, spec, cache=None):
+    if cache is None:
+        cache = SchemaCache(spec)
     properties = {}
     if 'allOf' in schema:
         for sub_schema in schema['allOf']:
-            sub_properties = extract_properties(sub_schema, spec)
+            sub_properties = extract_properties(sub_schema, spec, cache)
             properties.update(sub_properties)
     elif '$ref' in schema:
-        resolved_schema = resolve_ref(schema['$ref'], spec)
-        properties.update(extract_properties(resolved_schema, spec))
+        properties.update(cache.flatten(schema['$ref']))
     elif 'properties' in schema:
         for prop, prop_details in schema['properties'].items():
             if isinstance(prop_details, dict):
                 if '$ref' in prop_details:
-                    resolved_schema = resolve_ref(prop_details['$ref'], spec)
-                    sub_properties = extract_properties(resolved_schema, spec)
-                    properties.update(sub_properties)
+                    properties.update(cache.flatten(prop_details['$ref']))
                 elif 'items' in prop_details and '$ref' in prop_details['items']:
-                    resolved_schema = resolve_ref(prop_details['items']['$ref'], spec)
-                    sub_properties = extract_properties(resolved_schema, spec)
-                    properties.update(sub_properties)
+                    properties.update(cache.flatten(prop_details['items']['$ref']))
                 else:
                     prop_desc = prop_details.get('description', 'No description')
                     properties[prop] = prop_desc
             elif isinstance(prop_details, list):
                 for item in prop_details:
                     if '$ref' in item:
-                        resolved_schema = resolve_ref(item['$ref'], spec)
-                        sub_properties = extract_properties(resolved_schema, spec)
-                        properties.update(sub_properties)
+                        properties.update(cache.flatten(item['$ref']))
                     else:
                         prop_desc = item.get('description', 'No description')
                         properties[prop] = prop_desc
     return properties
 
-def extract_responses(responses, spec):
+def extract_responses(responses, spec, cache=None):
+    if cache is None:
+        cache = SchemaCache(spec)
     concise_responses = {}
     for status, details in responses.items():
         concise_responses[status] = []
         if 'content' in details:
             for content_type, content_details in details['content'].items():
                 schema = content_details.get('schema', {})
-                properties = extract_properties(schema, spec)
+                properties = extract_properties(schema, spec, cache)
                 for prop, prop_desc in properties.items():
                     concise_responses[status].append(f"{prop}: {prop_desc}")
     return concise_responses
 
-def extract_request_body(requestBody, spec):
+def extract_request_body(requestBody, spec, cache=None):
+    if cache is None:
+        cache = SchemaCache(spec)
     concise_request_body = []
     if 'content' in requestBody:
         for content_type, content_details in requestBody['content'].items():
             schema = content_details.get('schema', {})
-            properties = extract_properties(schema, spec)
+            properties = extract_properties(schema, spec, cache)
             for prop, prop_desc in properties.items():
                 concise_request_body.append(f"{prop}: {prop_desc}")
     return concise_request_body
 
+def response_fields(responses, spec, cache=None):
+    if cache is None:
+        cache = SchemaCache(spec)
+    fields = []
+    for status, details in responses.items():
+        properties = {}
+        if 'content' in details:
+            for content_type, content_details in details['content'].items():
+                properties.update(extract_properties(content_details.get('schema', {}), spec, cache))
+        fields.append((sys.intern(str(status)), field_pairs(properties, cache.shared)))
+    return tuple(fields)
+
+def request_body_fields(requestBody, spec, cache=None):
+    if cache is None:
+        cache = SchemaCache(spec)
+    properties = {}
+    if 'content' in requestBody:
+        for content_type, content_details in requestBody['content'].items():
+            properties.update(extract_properties(content_details.get('schema', {}), spec, cache))
+    return field_pairs(properties, cache.shared)
+
+def endpoint_id(spec, path, method, filename=''):
+    # Stable across re-extraction: the same operation in the same spec file
+    # always maps to the same document id, so the index can be updated in
+    # place. The filename keeps two files sharing an info.title apart.
+    source = (spec.get('info') or {}).get('title', '')
+    return hashlib.sha1(f"{filename}|{source}|{method.upper()}|{path}".encode('utf-8')).hexdigest()
+
+def iter_operations(spec):
+    for path, methods in spec['paths'].items():
+        if isinstance(methods, dict):
+            for method, details in methods.items():
+                if isinstance(details, dict):
+                    yield path, method, details
+
+def iter_endpoints(spec, cache=None, filename=''):
+    if cache is None:
+        cache = SchemaCache(spec)
+    for path, method, details in iter_operations(spec):
+        yield EndpointRecord(
+            endpoint_id(spec, path, method, filename),
+            path,
+            method,
+            summary=details.get('summary', ''),
+            description=details.get('description', ''),
+            operation_id=details.get('operationId', ''),
+            tags=details.get('tags', []),
+            responses=response_fields(details.get('responses', {}), spec, cache),
+            request_body=request_body_fields(details.get('requestBody', {}), spec, cache),
+        )
+
+def extract_endpoints(spec, cache=None, filename=''):
+    return list(iter_endpoints(spec, cache, filename))
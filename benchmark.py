@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+import subprocess
+import yaml
+from api_loader import load_spec_document, iter_endpoints, iter_operations, extract_responses, extract_request_body, SchemaCache
+from endpoint_record import size_report
+from schema_table import SchemaTable
+from search_backend import LocalBackend
+from llm_handler import build_prompt, PROMPT_TOKEN_BUDGET
+from query_processor import decompose_query, detect_intent
+from reranker import Reranker
+from engine import build_search_query, RERANK_TOP_K
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
+BENCHMARK_SPECS = ["1uisdk-connect-api-Swagger-61.0.yaml", "train-travel-api-openapi-source.json"]
+BENCHMARK_SCALES = [1, 10, 100]
+BENCHMARK_REPEAT = 3
+BENCHMARK_QUERIES = [
+    "book a train trip and pay for the booking",
+    "list the trips between two stations",
+    "get account details and recent transactions",
+    "refresh a provider account and check its status",
+    "register a new user and link a provider account",
+    "get investment holdings for an account",
+    "download statements for a credit card account",
+    "delete a booking",
+]
+BENCHMARK_INDEX = "benchmark"
+BENCHMARK_RESULTS = "benchmark_results.json"
+NUM_RESPONSES = 15
+# Labelled questions over the train-travel spec: {"question", "expected"
+# operationIds}. Recall is measured per question over the union of its
+# sub-queries' hits (and over their first hits only, for recall@1), with and
+# without re-ranking, at each candidate count.
+RERANK_QUERIES = "train_travel_queries.jsonl"
+RERANK_SWEEP = [5, 10, 15]
+# A stage regresses when its median is this fraction slower than the
+# baseline and also slower by more than the noise floor in seconds.
+REGRESSION_THRESHOLD = 0.25
+NOISE_FLOOR = 0.005
+# Cold import of the entry points, measured in a fresh interpreter: about
+# 0.06s for main and service together (0.35s when nltk was imported and asked
+# to download stopwords). The budget leaves headroom for slower hosts. None of
+# the heavy dependencies may be imported at startup.
+STARTUP_MODULES = ["main", "service"]
+STARTUP_BUDGET = 0.1
+STARTUP_FORBIDDEN = ["nltk", "marqo", "requests", "numpy", "pyperclip", "yaml"]
+STARTUP_SCRIPT = """
+import sys, json, time
+started = time.perf_counter()
+import {modules}
+print(json.dumps({{'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}}))
+"""
+
+class NoAliasDumper(SafeDumper):
+    # Write copied operations out in full rather than as YAML aliases, so the
+    # scaled files cost what a genuinely larger spec would to parse.
+    def ignore_aliases(self, data):
+        return True
+
+def scale_spec(spec, factor):
+    # Copies every operation factor times under /copyN prefixes with unique
+    # operationIds; components are shared, as they would be in a large spec.
+    if factor == 1:
+        return spec
+    paths = dict(spec['paths'])
+    for copy in range(1, factor):
+        for path, methods in spec['paths'].items():
+            if isinstance(methods, dict):
+                methods = {method: dict(details, operationId=f"{details['operationId']}_{copy}")
+                           if isinstance(details, dict) and details.get('operationId') else details
+                           for method, details in methods.items()}
+            paths[f"/copy{copy}{path}"] = methods
+    return dict(spec, paths=paths)
+
+def write_scaled_specs(source_dir, target_dir, factor):
+    filepaths = []
+    for filename in BENCHMARK_SPECS:
+        spec = scale_spec(load_spec_document(os.path.join(source_dir, filename)), factor)
+        filepath = os.path.join(target_dir, filename)
+        with open(filepath, 'w') as f:
+            if filename.endswith(".json"):
+                json.dump(spec, f)
+            else:
+                yaml.dump(spec, f, Dumper=NoAliasDumper, sort_keys=False)
+        filepaths.append(filepath)
+    return filepaths
+
+def time_stage(function, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return result, timings
+
+def stage_result(timings, items):
+    median = statistics.median(timings)
+    return {
+        'median': median,
+        'min': min(timings),
+        'runs': timings,
+        'items': items,
+        'per_item': median / items if items else None,
+    }
+
+def legacy_documents(spec):
+    # The str()-ed endpoint dicts main.py indexed before EndpointRecord, kept
+    # here so size reports can compare against them.
+    cache = SchemaCache(spec)
+    return [{
+        'path': path,
+        'method': method,
+        'summary': details.get('summary', ''),
+        'description': details.get('description', ''),
+        'tags': ', '.join(details.get('tags', [])),
+        'responses': str(extract_responses(details.get('responses', {}), spec, cache)),
+        'operationId': details.get('operationId', ''),
+        'requestBody': str(extract_request_body(details.get('requestBody', {}), spec, cache)),
+    } for path, method, details in iter_operations(spec)]
+
+def run_scale(filepaths, repeat, work_dir):
+    results = {}
+
+    def load():
+        return [(os.path.basename(filepath), load_spec_document(filepath)) for filepath in filepaths]
+    specs, timings = time_stage(load, repeat)
+    results['load'] = stage_result(timings, len(specs))
+
+    def extract():
+        records = []
+        for filename, spec in specs:
+            records.extend(iter_endpoints(spec, SchemaCache(spec), filename))
+        return records
+    records, timings = time_stage(extract, repeat)
+    results['extract'] = stage_result(timings, len(records))
+
+    def build_documents():
+        schemas = SchemaTable()
+        return schemas, [record.index_document(schemas) for record in records]
+    (schemas, documents), timings = time_stage(build_documents, repeat)
+    results['documents'] = stage_result(timings, len(documents))
+
+    backend = LocalBackend(os.path.join(work_dir, "index"))
+
+    def index():
+        backend.delete_index(BENCHMARK_INDEX)
+        backend.create_index(BENCHMARK_INDEX)
+        backend.add_documents(BENCHMARK_INDEX, documents)
+        backend.refresh(BENCHMARK_INDEX)
+    _, timings = time_stage(index, repeat)
+    results['index'] = stage_result(timings, len(documents))
+
+    def search():
+        return [backend.search(BENCHMARK_INDEX, query, NUM_RESPONSES) for query in BENCHMARK_QUERIES]
+    hits, timings = time_stage(search, repeat)
+    results['search'] = stage_result(timings, len(BENCHMARK_QUERIES))
+
+    def prompts():
+        return [build_prompt(query_hits, query, PROMPT_TOKEN_BUDGET, schemas=schemas)
+                for query, query_hits in zip(BENCHMARK_QUERIES, hits)]
+    _, timings = time_stage(prompts, repeat)
+    results['prompt'] = stage_result(timings, len(BENCHMARK_QUERIES))
+    legacy = [document for _, spec in specs for document in legacy_documents(spec)]
+    return results, size_report(records, legacy)
+
+def load_labelled_queries(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def recall(labelled, results):
+    expected = sum(len(item['expected']) for item in labelled)
+    found = sum(len(set(item['expected']) & {hit.get('operationId') for hit in hits})
+                for item, hits in zip(labelled, results))
+    return found / expected if expected else 0.0
+
+def run_rerank(source_dir, work_dir, repeat, labelled):
+    records = []
+    for filename in BENCHMARK_SPECS:
+        spec = load_spec_document(os.path.join(source_dir, filename))
+        records.extend(iter_endpoints(spec, SchemaCache(spec), filename))
+    schemas = SchemaTable()
+    backend = LocalBackend(os.path.join(work_dir, "rerank"))
+    backend.create_index(BENCHMARK_INDEX)
+    backend.add_documents(BENCHMARK_INDEX, [record.index_document(schemas) for record in records])
+    backend.refresh(BENCHMARK_INDEX)
+    reranker = Reranker()
+    for record in records:
+        reranker.add(record)
+    reranker.build()
+    steps = [[(sub_query, build_search_query(sub_query), detect_intent(sub_query)) for sub_query in decompose_query(item['question'])]
+             for item in labelled]
+
+    def answer(candidates, top_k):
+        results = []
+        for question_steps in steps:
+            step_hits = []
+            for sub_query, search_query, intent in question_steps:
+                hits = backend.search(BENCHMARK_INDEX, search_query, candidates)
+                if top_k is not None:
+                    hits = reranker.rerank(sub_query, hits, top_k, intent)
+                step_hits.append(hits)
+            results.append(step_hits)
+        return results
+
+    results = {}
+    for candidates in RERANK_SWEEP:
+        for top_k in (None, RERANK_TOP_K):
+            if top_k is not None and top_k >= candidates:
+                continue
+            name = f"search@{candidates}" if top_k is None else f"rerank@{candidates}->{top_k}"
+            hits, timings = time_stage(lambda: answer(candidates, top_k), repeat)
+            results[name] = stage_result(timings, len(labelled))
+            results[name]['recall'] = recall(labelled, [[hit for step in steps for hit in step] for steps in hits])
+            results[name]['recall_at_1'] = recall(labelled, [[step[0] for step in steps if step] for steps in hits])
+            results[name]['hits_per_question'] = sum(len(step) for steps in hits for step in steps) / len(labelled)
+    return results
+
+def measure_startup(directory, repeat, modules=STARTUP_MODULES):
+    script = STARTUP_SCRIPT.format(modules=', '.join(modules))
+    timings = []
+    loaded = set()
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", script], cwd=directory, capture_output=True,
+                                text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result['seconds'])
+        loaded.update(result['modules'])
+    result = stage_result(timings, len(modules))
+    result['forbidden_imports'] = sorted(module for module in STARTUP_FORBIDDEN if module in loaded)
+    return result
+
+def check_startup(result, budget=STARTUP_BUDGET):
+    problems = []
+    if result['median'] > budget:
+        problems.append(f"cold import took {result['median'] * 1000:.1f} ms, over the {budget * 1000:.0f} ms budget")
+    if result['forbidden_imports']:
+        problems.append(f"heavy modules imported at startup: {', '.join(result['forbidden_imports'])}")
+    return problems
+
+def run_benchmarks(source_dir, scales=BENCHMARK_SCALES, repeat=BENCHMARK_REPEAT):
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': time.time(),
+            'repeat': repeat,
+            'scales': scales,
+        },
+        'results': {},
+    }
+    labelled = load_labelled_queries(os.path.join(source_dir, RERANK_QUERIES))
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"Re-ranking ({len(labelled)} labelled questions):")
+        for name, result in run_rerank(source_dir, work_dir, repeat, labelled).items():
+            report['results'][f"rerank/{name}"] = result
+            print(f"  {name:<14} recall {result['recall']:.2f} (@1 {result['recall_at_1']:.2f}) from "
+                  f"{result['hits_per_question']:4.1f} hits  {result['per_item'] * 1000:8.3f} ms per question")
+    result = measure_startup(source_dir, repeat)
+    report['results']['startup/import'] = result
+    print(f"Startup: importing {', '.join(STARTUP_MODULES)} took {result['median'] * 1000:.2f} ms.")
+    for factor in scales:
+        with tempfile.TemporaryDirectory() as work_dir:
+            if factor == 1:
+                filepaths = [os.path.join(source_dir, filename) for filename in BENCHMARK_SPECS]
+            else:
+                filepaths = write_scaled_specs(source_dir, work_dir, factor)
+            print(f"Benchmarking {factor}x ({', '.join(os.path.basename(path) for path in filepaths)})...")
+            results, sizes = run_scale(filepaths, repeat, work_dir)
+            for stage, result in results.items():
+                report['results'][f"{factor}x/{stage}"] = result
+                print(f"  {stage:<10} {result['median'] * 1000:10.2f} ms  ({result['items']} items)")
+            report.setdefault('sizes', {})[f"{factor}x"] = sizes
+            endpoints = max(sizes['endpoints'], 1)
+            print(f"  records    {sizes['binary_bytes']} bytes packed, {sizes['document_bytes']} bytes as documents "
+                  f"({sizes['legacy_document_bytes']} legacy), {sizes['memory_bytes'] // endpoints} bytes in memory "
+                  f"per endpoint ({sizes['legacy_memory_bytes'] // endpoints} legacy)")
+    return report
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD, noise_floor=NOISE_FLOOR):
+    regressions = []
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        change = result['median'] / previous['median'] - 1 if previous['median'] else 0.0
+        result['baseline'] = previous['median']
+        result['change'] = change
+        if change > threshold and result['median'] - previous['median'] > noise_floor:
+            regressions.append(name)
+        print(f"  {name:<16} {previous['median'] * 1000:10.2f} -> {result['median'] * 1000:10.2f} ms "
+              f"({change:+.1%}){'  REGRESSION' if name in regressions else ''}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark spec loading, extraction, indexing, search and prompt building.")
+    parser.add_argument('--directory', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="directory containing the bundled specs")
+    parser.add_argument('--scales', default=','.join(str(scale) for scale in BENCHMARK_SCALES),
+                        help="comma-separated operation multipliers (default: 1,10,100)")
+    parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT)
+    parser.add_argument('--output', default=BENCHMARK_RESULTS, help="file to write the JSON results to")
+    parser.add_argument('--baseline', default=None, help="results file from an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="fractional slowdown that counts as a regression (default: 0.25)")
+    parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET,
+                        help="seconds allowed for a cold import of the entry points (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    scales = [int(scale) for scale in args.scales.split(',') if scale.strip()]
+    report = run_benchmarks(args.directory, scales, args.repeat)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Comparing with {args.baseline}:")
+        regressions = compare(report, baseline, args.threshold)
+        report['regressions'] = regressions
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote results to {args.output}.")
+    failed = False
+    for problem in check_startup(report['results']['startup/import'], args.startup_budget):
+        print(f"Startup check failed: {problem}")
+        failed = True
+    if regressions:
+        print(f"{len(regressions)} stage(s) regressed past {args.threshold:.0%}: {', '.join(regressions)}")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import os
+import mmap
+import struct
+import hashlib
+from endpoint_record import write_string, read_string
+
+CATALOG_MAGIC = b"APICAT01"
+# magic, entry count, field count
+CATALOG_HEADER = struct.Struct("<8sII")
+# key (sha1 of the endpoint id), payload offset, payload length
+CATALOG_ENTRY = struct.Struct("<20sQI")
+KEY_SIZE = 20
+# Each payload starts with its field count, then one byte per field naming it
+# and one u32 per field giving its UTF-8 length, so a document is read with
+# a single unpack followed by one slice and decode per field.
+PAYLOAD_LAYOUTS = {}
+
+def payload_layout(field_count):
+    layout = PAYLOAD_LAYOUTS.get(field_count)
+    if layout is None:
+        layout = PAYLOAD_LAYOUTS[field_count] = struct.Struct(f"<B{field_count}B{field_count}I")
+    return layout
+
+def catalog_key(endpoint_id):
+    return hashlib.sha1(endpoint_id.encode('utf-8')).digest()
+
+# Streams endpoint documents into a catalog file. Payloads are appended to a
+# temporary data file as they arrive and only the (key, offset, length)
+# entries are kept in memory; close() writes the header, the field names,
+# the entries sorted by key and then the payloads, and moves the file into
+# place atomically so open readers keep the previous version.
+class CatalogWriter:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.data_path = f"{path}.{os.getpid()}.data"
+        self.data = open(self.data_path, 'wb')
+        self.size = 0
+        self.fields = {}
+        self.entries = []
+
+    def add(self, document):
+        names = []
+        values = []
+        for name, value in document.items():
+            if name == '_id':
+                continue
+            if name not in self.fields:
+                if len(self.fields) == 256:
+                    raise ValueError("catalog documents are limited to 256 distinct fields")
+                self.fields[name] = len(self.fields)
+            names.append(self.fields[name])
+            values.append(str(value).encode('utf-8'))
+        out = payload_layout(len(names)).pack(len(names), *names, *(len(value) for value in values)) + b''.join(values)
+        self.entries.append((catalog_key(document['_id']), self.size, len(out)))
+        self.data.write(out)
+        self.size += len(out)
+
+    def close(self):
+        self.data.close()
+        self.entries.sort()
+        header = bytearray(CATALOG_HEADER.pack(CATALOG_MAGIC, len(self.entries), len(self.fields)))
+        for name in self.fields:
+            write_string(header, name)
+        base = len(header) + CATALOG_ENTRY.size * len(self.entries)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            for key, offset, length in self.entries:
+                f.write(CATALOG_ENTRY.pack(key, base + offset, length))
+            with open(self.data_path, 'rb') as data:
+                while True:
+                    chunk = data.read(1 << 20)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        os.remove(self.data_path)
+        os.replace(tmp_path, self.path)
+        return {'endpoints': len(self.entries), 'bytes': base + self.size}
+
+    def abort(self):
+        self.data.close()
+        if os.path.exists(self.data_path):
+            os.remove(self.data_path)
+
+# Read-only view of a catalog file through mmap. Lookups binary-search the
+# sorted entry table in place and decode only the payload asked for, so
+# nothing is loaded up front and processes opening the same file share its
+# pages through the OS page cache.
+class EndpointCatalog:
+    def __init__(self, path=None):
+        self.path = path
+        self.map = None
+        self.count = 0
+        self.fields = []
+        self.entries_start = 0
+        if path is not None:
+            self.open(path)
+
+    def __len__(self):
+        return self.count
+
+    def open(self, path):
+        try:
+            with open(path, 'rb') as f:
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+        magic, count, field_count = CATALOG_HEADER.unpack_from(view, 0)
+        if magic != CATALOG_MAGIC:
+            view.close()
+            return
+        position = CATALOG_HEADER.size
+        fields = []
+        for _ in range(field_count):
+            name, position = read_string(view, position)
+            fields.append(name)
+        self.map, self.count, self.fields, self.entries_start = view, count, fields, position
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            self.count = 0
+
+    def find(self, endpoint_id):
+        key = catalog_key(endpoint_id)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = self.entries_start + middle * CATALOG_ENTRY.size
+            candidate = self.map[start:start + KEY_SIZE]
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                return CATALOG_ENTRY.unpack_from(self.map, start)[1]
+        return None
+
+    def get(self, endpoint_id):
+        if self.map is None:
+            return None
+        position = self.find(endpoint_id)
+        if position is None:
+            return None
+        field_count = self.map[position]
+        layout = payload_layout(field_count)
+        header = layout.unpack_from(self.map, position)
+        position += layout.size
+        document = {}
+        for field, length in zip(header[1:field_count + 1], header[field_count + 1:]):
+            document[self.fields[field]] = self.map[position:position + length].decode('utf-8')
+            position += length
+        return document
+
+    def get_many(self, endpoint_ids):
+        documents = {}
+        for endpoint_id in endpoint_ids:
+            document = self.get(endpoint_id)
+            if document is not None:
+                documents[endpoint_id] = dict(document, _id=endpoint_id)
+        return documents
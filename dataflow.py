@@ -0,0 +1,259 @@
+import os
+import re
+import json
+
+DATAFLOW_VERSION = 1
+# Only identifier-like fields are linked; descriptive fields such as names or
+# amounts appear everywhere and would connect every operation to every other.
+IDENTIFIER_SUFFIXES = ("id", "key", "token", "number")
+# Keys produced by more operations than this are too generic to wire on.
+MAX_KEY_PRODUCERS = 12
+DATAFLOW_DEPTH = 2
+DATAFLOW_DECAY = 0.5
+DATAFLOW_BOOST = 0.25
+DATAFLOW_MAX_ADDED = 3
+# Only hits scoring at least this fraction of their step's best hit are
+# expanded, so weak matches do not drag in their dependencies.
+DATAFLOW_MIN_SCORE_RATIO = 0.5
+DATAFLOW_PROMPT_EDGES = 20
+
+PATH_PARAMETER = re.compile(r"\{([^}]+)\}")
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]")
+
+def normalize_key(name):
+    key = NON_ALPHANUMERIC.sub('', name.lower())
+    return key[:-1] if key.endswith("ids") else key
+
+def singular(word):
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def static_segments(path):
+    return [segment for segment in path.strip('/').split('/') if segment and not PATH_PARAMETER.fullmatch(segment)]
+
+def resource_name(path):
+    # /bookings/{bookingId}/payment -> "payment", /trips -> "trip".
+    segments = static_segments(path)
+    return normalize_key(singular(segments[-1])) if segments else ""
+
+def is_identifier(key):
+    return key.endswith(IDENTIFIER_SUFFIXES) and key not in IDENTIFIER_SUFFIXES
+
+def produced_keys(record):
+    # Identifiers an operation returns in its successful responses. A bare
+    # "id" is qualified with the resource the path names, so GET /trips
+    # produces "tripid".
+    keys = set()
+    resource = resource_name(record.path)
+    for status, fields in record.responses:
+        if not status.startswith('2'):
+            continue
+        for name, _ in fields:
+            key = normalize_key(name)
+            if key == "id" and resource:
+                key = resource + "id"
+            if is_identifier(key):
+                keys.add(key)
+    return keys
+
+def consumed_keys(record):
+    # Identifiers an operation needs: its path parameters and request body
+    # fields. A bare {id} parameter takes the name of the segment before it.
+    keys = {}
+    segments = record.path.strip('/').split('/')
+    for i, segment in enumerate(segments):
+        match = PATH_PARAMETER.fullmatch(segment)
+        if not match:
+            continue
+        key = normalize_key(match.group(1))
+        if key == "id" and i > 0:
+            key = normalize_key(singular(segments[i - 1])) + "id"
+        if is_identifier(key):
+            keys.setdefault(key, match.group(1))
+    for name, _ in record.request_body:
+        key = normalize_key(name)
+        if is_identifier(key):
+            keys.setdefault(key, name)
+    return keys
+
+# Links operations whose response identifiers match other operations'
+# request body fields or path parameters. Built once per ingest from the
+# streamed endpoint records and stored in compressed sparse row form in both
+# directions: out_ptr[n]:out_ptr[n + 1] slices the consumers of node n (with
+# the key each edge carries), in_ptr likewise its producers.
+class DataflowGraph:
+    def __init__(self):
+        self.nodes = []
+        self.labels = []
+        self.node_index = {}
+        self.keys = []
+        self.out_ptr = [0]
+        self.out_node = []
+        self.out_key = []
+        self.in_ptr = [0]
+        self.in_node = []
+        self.in_key = []
+        self.pending = []
+
+    @property
+    def edge_count(self):
+        return len(self.out_node)
+
+    def add(self, record):
+        self.pending.append((record.id, f"{record.method.upper()} {record.path}",
+                             produced_keys(record), consumed_keys(record)))
+
+    def build(self, max_producers=MAX_KEY_PRODUCERS):
+        self.nodes = [node_id for node_id, _, _, _ in self.pending]
+        self.labels = [label for _, label, _, _ in self.pending]
+        self.node_index = {node_id: i for i, node_id in enumerate(self.nodes)}
+        producers = {}
+        for i, (_, _, produces, _) in enumerate(self.pending):
+            for key in produces:
+                producers.setdefault(key, []).append(i)
+        key_index = {}
+        edges = []
+        for consumer, (_, _, _, consumes) in enumerate(self.pending):
+            for key, name in consumes.items():
+                key_producers = producers.get(key, [])
+                if len(key_producers) > max_producers:
+                    continue
+                for producer in key_producers:
+                    if producer == consumer:
+                        continue
+                    if key not in key_index:
+                        key_index[key] = len(self.keys)
+                        self.keys.append(name)
+                    edges.append((producer, consumer, key_index[key]))
+        self.pending = []
+        self.out_ptr, self.out_node, self.out_key = compress(edges, len(self.nodes), 0, 1)
+        self.in_ptr, self.in_node, self.in_key = compress(edges, len(self.nodes), 1, 0)
+        return self.stats()
+
+    def stats(self):
+        return {
+            'operations': len(self.nodes),
+            'edges': self.edge_count,
+            'keys': len(self.keys),
+            'producers': sum(1 for i in range(len(self.nodes)) if self.out_ptr[i + 1] > self.out_ptr[i]),
+            'consumers': sum(1 for i in range(len(self.nodes)) if self.in_ptr[i + 1] > self.in_ptr[i]),
+        }
+
+    def upstream(self, node_id):
+        i = self.node_index.get(node_id)
+        if i is None:
+            return []
+        return [(self.nodes[self.in_node[e]], self.keys[self.in_key[e]]) for e in range(self.in_ptr[i], self.in_ptr[i + 1])]
+
+    def downstream(self, node_id):
+        i = self.node_index.get(node_id)
+        if i is None:
+            return []
+        return [(self.nodes[self.out_node[e]], self.keys[self.out_key[e]]) for e in range(self.out_ptr[i], self.out_ptr[i + 1])]
+
+    def walk_upstream(self, node_id, depth=DATAFLOW_DEPTH):
+        # Breadth-first over producers: yields (producer, key, consumer,
+        # distance) for every producer within depth hops.
+        seen = {node_id}
+        frontier = [node_id]
+        for distance in range(1, depth + 1):
+            next_frontier = []
+            for consumer in frontier:
+                for producer, key in self.upstream(consumer):
+                    if producer in seen:
+                        continue
+                    seen.add(producer)
+                    next_frontier.append(producer)
+                    yield producer, key, consumer, distance
+            frontier = next_frontier
+
+    def edges_with(self, node_id, node_ids):
+        # The (producer, key, consumer) edges joining node_id to node_ids in
+        # either direction.
+        return ([(node_id, key, consumer) for consumer, key in self.downstream(node_id) if consumer in node_ids] +
+                [(producer, key, node_id) for producer, key in self.upstream(node_id) if producer in node_ids])
+
+    def label(self, node_id):
+        i = self.node_index.get(node_id)
+        return self.labels[i] if i is not None else node_id
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': DATAFLOW_VERSION, 'nodes': self.nodes, 'labels': self.labels, 'keys': self.keys,
+                       'out_ptr': self.out_ptr, 'out_node': self.out_node, 'out_key': self.out_key,
+                       'in_ptr': self.in_ptr, 'in_node': self.in_node, 'in_key': self.in_key}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        graph = cls()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return graph
+        if data.get('version') != DATAFLOW_VERSION:
+            return graph
+        for name in ('nodes', 'labels', 'keys', 'out_ptr', 'out_node', 'out_key', 'in_ptr', 'in_node', 'in_key'):
+            setattr(graph, name, data[name])
+        graph.node_index = {node_id: i for i, node_id in enumerate(graph.nodes)}
+        return graph
+
+def compress(edges, node_count, source, target):
+    edges = sorted(edges, key=lambda edge: (edge[source], edge[target], edge[2]))
+    ptr = [0] * (node_count + 1)
+    for edge in edges:
+        ptr[edge[source] + 1] += 1
+    for i in range(node_count):
+        ptr[i + 1] += ptr[i]
+    return ptr, [edge[target] for edge in edges], [edge[2] for edge in edges]
+
+def expand_chain(api_chain, graph, fetch_documents, limit, depth=DATAFLOW_DEPTH, max_added=DATAFLOW_MAX_ADDED):
+    # Walks the graph upstream from each step's hits. Hits that feed or are
+    # fed by a hit of another step are boosted, each step is pruned back to
+    # limit, and the best producers of identifiers the step needs but no step
+    # returned are fetched and appended, annotated with what they provide.
+    step_ids = [{hit.get('_id') for hit in step['relevant_apis']} for step in api_chain]
+    all_ids = set().union(*step_ids) if step_ids else set()
+    wanted = {}
+    for i, step in enumerate(api_chain):
+        other_ids = all_ids - step_ids[i]
+        rescored = []
+        for rank, hit in enumerate(step['relevant_apis']):
+            connected = any(producer in other_ids for producer, _ in graph.upstream(hit.get('_id'))) or \
+                any(consumer in other_ids for consumer, _ in graph.downstream(hit.get('_id')))
+            score = hit.get('_score', 0.0)
+            rescored.append((-(score * (1.0 + DATAFLOW_BOOST) if connected else score), rank, hit))
+        rescored.sort(key=lambda item: item[:2])
+        hits = [hit for _, _, hit in rescored[:limit]]
+        step['relevant_apis'] = hits
+        candidates = {}
+        threshold = max((hit.get('_score', 0.0) for hit in hits), default=0.0) * DATAFLOW_MIN_SCORE_RATIO
+        for hit in hits:
+            if hit.get('_score', 0.0) < threshold:
+                continue
+            for producer, key, consumer, distance in graph.walk_upstream(hit.get('_id'), depth):
+                if producer in all_ids:
+                    continue
+                score = hit.get('_score', 0.0) * DATAFLOW_DECAY ** distance
+                if producer not in candidates or score > candidates[producer][0]:
+                    candidates[producer] = (score, key, consumer)
+        best = sorted(candidates.items(), key=lambda item: -item[1][0])[:max_added]
+        for producer, candidate in best:
+            wanted.setdefault(producer, []).append((i, candidate))
+    if not wanted:
+        return api_chain
+    documents = fetch_documents(list(wanted))
+    for producer, placements in wanted.items():
+        document = documents.get(producer)
+        if document is None:
+            continue
+        for i, (score, key, consumer) in placements:
+            api_chain[i]['relevant_apis'].append(dict(document, _id=producer, _score=score,
+                                                      _dataflow={'provides': key, 'to': graph.label(consumer)}))
+    return api_chain
@@ -0,0 +1,238 @@
+import sys
+import json
+import hashlib
+
+RECORD_FORMAT_VERSION = 1
+# Part of every fingerprint, so a change to how documents are rendered
+# re-indexes existing endpoints on the next sync.
+DOCUMENT_FORMAT_VERSION = 3
+NO_DESCRIPTION = 'No description'
+
+# One extracted operation. Responses are kept as ((status, ((field, description), ...)), ...)
+# and the request body as ((field, description), ...), so the structure survives
+# until it is rendered: index_document() for the search backend and
+# render_prompt_block() for the LLM prompt.
+class EndpointRecord:
+    __slots__ = ('id', 'path', 'method', 'summary', 'description', 'operation_id', 'tags',
+                 'responses', 'request_body', 'fingerprint')
+
+    def __init__(self, id, path, method, summary='', description='', operation_id='', tags=(),
+                 responses=(), request_body=(), fingerprint=''):
+        self.id = id
+        self.path = path
+        self.method = method
+        self.summary = summary
+        self.description = description
+        self.operation_id = operation_id
+        self.tags = tuple(tags)
+        self.responses = tuple(responses)
+        self.request_body = tuple(request_body)
+        self.fingerprint = fingerprint or self.compute_fingerprint()
+
+    def compute_fingerprint(self):
+        content = json.dumps([DOCUMENT_FORMAT_VERSION, self.path, self.method, self.summary, self.description, self.operation_id,
+                              self.tags, self.responses, self.request_body])
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def index_document(self, schemas=None):
+        # With a SchemaTable, response bodies are stored once in the table and
+        # the document only carries their ids. The request body stays inline
+        # because it is a tensor field, but its id is kept for prompts.
+        document = {
+            '_id': self.id,
+            'path': self.path,
+            'method': self.method,
+            'summary': self.summary,
+            'description': self.description,
+            'tags': ', '.join(self.tags),
+            'responses': render_responses(self.responses, schemas),
+            'operationId': self.operation_id,
+            'requestBody': render_fields(self.request_body),
+            'fingerprint': self.fingerprint,
+        }
+        if schemas is not None:
+            document['requestBodySchema'] = schemas.intern(self.request_body) or ''
+        return document
+
+    def to_bytes(self):
+        out = bytearray()
+        out.append(RECORD_FORMAT_VERSION)
+        for value in (self.id, self.fingerprint, self.path, self.method, self.summary,
+                      self.description, self.operation_id):
+            write_string(out, value)
+        write_varint(out, len(self.tags))
+        for tag in self.tags:
+            write_string(out, tag)
+        write_varint(out, len(self.responses))
+        for status, fields in self.responses:
+            write_string(out, status)
+            write_fields(out, fields)
+        write_fields(out, self.request_body)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data, shared=None):
+        if data[0] != RECORD_FORMAT_VERSION:
+            raise ValueError(f"Unsupported endpoint record version {data[0]}")
+        position = 1
+        values = []
+        for _ in range(7):
+            value, position = read_string(data, position)
+            values.append(value)
+        count, position = read_varint(data, position)
+        tags = []
+        for _ in range(count):
+            tag, position = read_string(data, position)
+            tags.append(tag)
+        count, position = read_varint(data, position)
+        responses = []
+        for _ in range(count):
+            status, position = read_string(data, position)
+            fields, position = read_fields(data, position)
+            responses.append((status, fields))
+        request_body, position = read_fields(data, position)
+        if shared is not None:
+            responses = share_responses(responses, shared)
+            request_body = share_fields(request_body, shared)
+        id, fingerprint, path, method, summary, description, operation_id = values
+        return cls(id, path, method, summary, description, operation_id, tags, responses, request_body, fingerprint)
+
+def render_fields(fields):
+    return '; '.join(f"{name}: {description}" if description else name for name, description in fields)
+
+def render_responses(responses, schemas=None):
+    # Statuses without a body are collapsed onto one line.
+    if schemas is not None:
+        lines = [f"{status}: {schemas.intern(fields)}" for status, fields in responses if fields]
+    else:
+        lines = [f"{status}: {render_fields(fields)}" for status, fields in responses if fields]
+    empty = [status for status, fields in responses if not fields]
+    if empty:
+        lines.append(', '.join(empty))
+    return '\n'.join(lines)
+
+def indent_lines(text, indent):
+    # Continuation lines of a multi-line value line up under its first line.
+    return text.replace('\n', '\n' + ' ' * indent)
+
+def render_prompt_block(api, full=True, shared_schemas=False):
+    # With shared_schemas, schema ids are left as references to the prompt's
+    # shared schema section instead of the request body being inlined.
+    request_body = api['requestBody']
+    if shared_schemas and api.get('requestBodySchema'):
+        request_body = api['requestBodySchema']
+    if not full:
+        return (
+            f"  - OperationId: {api['operationId']}\n"
+            f"    Signature: {api['method'].upper()} {api['path']}\n"
+            f"    Summary: {api['summary']}\n"
+            "-----\n"
+        )
+    return (
+        f"  - OperationId: {api['operationId']}\n"
+        f"    Summary: {api['summary']}\n"
+        f"    Description: {api['description']}\n"
+        f"    Path: {api['path']}\n"
+        f"    Method: {api['method']}\n"
+        f"    Tags: {api['tags']}\n"
+        f"    Responses: {indent_lines(api['responses'], 15)}\n"
+        f"    Request Body: {request_body}\n"
+        "-----\n"
+    )
+
+def field_pairs(properties, shared=None):
+    # Normalizes extract_properties output; the 'No description' placeholder
+    # is dropped so it is not repeated in every document and prompt.
+    pairs = []
+    for name, description in properties.items():
+        if not isinstance(description, str):
+            description = '' if description is None else str(description)
+        if description == NO_DESCRIPTION:
+            description = ''
+        pairs.append((name, description))
+    if shared is None:
+        return tuple(pairs)
+    return share_fields(pairs, shared)
+
+def share_fields(fields, shared):
+    # Operations that reuse a schema share one tuple of field pairs (and the
+    # strings inside it) instead of holding their own copies.
+    fields = tuple(shared.setdefault((name, description), (name, description)) for name, description in fields)
+    return shared.setdefault(fields, fields)
+
+def share_responses(responses, shared):
+    return tuple((sys.intern(status), share_fields(fields, shared)) for status, fields in responses)
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+def write_string(out, value):
+    encoded = value.encode('utf-8')
+    write_varint(out, len(encoded))
+    out += encoded
+
+def read_string(data, position):
+    length, position = read_varint(data, position)
+    end = position + length
+    return bytes(data[position:end]).decode('utf-8'), end
+
+def write_fields(out, fields):
+    write_varint(out, len(fields))
+    for name, description in fields:
+        write_string(out, name)
+        write_string(out, description)
+
+def read_fields(data, position):
+    count, position = read_varint(data, position)
+    fields = []
+    for _ in range(count):
+        name, position = read_string(data, position)
+        description, position = read_string(data, position)
+        fields.append((name, description))
+    return tuple(fields), position
+
+def deep_sizeof(value, seen=None):
+    # Counts shared objects once when the same seen set is reused.
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(deep_sizeof(item, seen) for item in value)
+    elif hasattr(value, '__slots__'):
+        size += sum(deep_sizeof(getattr(value, slot), seen) for slot in value.__slots__ if hasattr(value, slot))
+    return size
+
+def size_report(records, legacy_documents=None):
+    # Document bytes and per-endpoint memory of the records, optionally
+    # compared with the legacy str()-ed endpoint dicts.
+    seen = set()
+    report = {
+        'endpoints': len(records),
+        'document_bytes': sum(len(json.dumps(record.index_document())) for record in records),
+        'binary_bytes': sum(len(record.to_bytes()) for record in records),
+        'memory_bytes': sum(deep_sizeof(record, seen) for record in records),
+    }
+    if legacy_documents is not None:
+        seen = set()
+        report['legacy_document_bytes'] = sum(len(json.dumps(document)) for document in legacy_documents)
+        report['legacy_memory_bytes'] = sum(deep_sizeof(document, seen) for document in legacy_documents)
+    return report
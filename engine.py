@@ -0,0 +1,821 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from api_loader import iter_openapi_specifications, SPEC_CACHE_DIR
+from query_processor import preprocess_query, detect_intent, decompose_query, construct_api_chain, merge_hits
+from llm_handler import build_prompt, get_llm_client, PROMPT_TOKEN_BUDGET
+from llm_client import format_metrics
+from search_backend import create_backend
+from search_cache import SearchCache, cache_key
+from schema_table import SchemaTable
+from dataflow import DataflowGraph
+from lookup import EndpointLookup
+from reranker import Reranker
+from catalog import CatalogWriter, EndpointCatalog
+from shards import ShardRouter, shard_index_name, group_documents, shard_digest, merge_by_score
+from metrics import span, count, observe
+
+INDEX_NAME = "api-endpoints"
+NUM_RESPONSES = 15
+# Search limit per sub-query when the dataflow graph fills in dependencies.
+DATAFLOW_NUM_RESPONSES = 6
+# With the re-ranker built, each sub-query fetches RERANK_CANDIDATES hits and
+# keeps the best RERANK_TOP_K after re-ranking.
+RERANK_CANDIDATES = 10
+RERANK_TOP_K = 5
+MAX_RELEVANT_APIS = 20
+# Besides the tensor fields, the index keeps only what sync compares and what
+# search filters on; everything else is hydrated from the endpoint catalog.
+INDEX_FIELDS = ('_id', 'fingerprint', 'method')
+# Fields a complete endpoint document has and a slim index document lacks.
+DOCUMENT_FIELDS = ('path', 'responses')
+# Score given to endpoints a query names exactly by operationId or path, above
+# anything the ranking returns so they lead the merged results.
+EXACT_MATCH_SCORE = 1000.0
+BATCH_SIZE = 128
+MIN_BATCH_SIZE = 8
+MAX_BATCH_SIZE = 512
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+INGEST_WORKERS = 4
+INGEST_RETRIES = 3
+INGEST_BACKOFF = 0.5
+INGEST_TARGET_LATENCY = 5.0
+PREFETCH_DOCUMENTS = 2 * BATCH_SIZE
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "marqo")
+# 'none' keeps one index; 'spec' or 'tag' splits it into one index per spec
+# file or per first tag.
+SHARD_BY = os.environ.get("SHARD_BY", "none")
+SHARD_WORKERS = 8
+SEARCH_CACHE_PATH = os.path.join(SPEC_CACHE_DIR, "search_cache.sqlite")
+
+def manifest_path(index_name):
+    return os.path.join(SPEC_CACHE_DIR, f"{index_name}.manifest.json")
+
+def load_index_manifest(index_name):
+    try:
+        with open(manifest_path(index_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_index_manifest(index_name, fingerprints):
+    os.makedirs(SPEC_CACHE_DIR, exist_ok=True)
+    with open(manifest_path(index_name), 'w') as f:
+        json.dump(fingerprints, f)
+
+def schema_table_path(index_name):
+    return os.path.join(SPEC_CACHE_DIR, f"{index_name}.schemas.json")
+
+def dataflow_path(index_name):
+    return os.path.join(SPEC_CACHE_DIR, f"{index_name}.dataflow.json")
+
+def lookup_path(index_name):
+    return os.path.join(SPEC_CACHE_DIR, f"{index_name}.lookup.json")
+
+def catalog_path(index_name, shard_by='none'):
+    # Sharded and unsharded layouts of one index each keep their own catalog.
+    if shard_by == 'none':
+        return os.path.join(SPEC_CACHE_DIR, f"{index_name}.catalog")
+    return os.path.join(SPEC_CACHE_DIR, f"{index_name}.{shard_by}.catalog")
+
+def rerank_path(index_name):
+    return os.path.join(SPEC_CACHE_DIR, f"{index_name}.rerank.npz")
+
+def shards_path(index_name):
+    return os.path.join(SPEC_CACHE_DIR, f"{index_name}.shards.json")
+
+def version_path(index_name):
+    return os.path.join(SPEC_CACHE_DIR, f"{index_name}.version")
+
+def file_stamp(path):
+    # Changes whenever the file is replaced, as every save here does.
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+def prefetch(iterable, maxsize=PREFETCH_DOCUMENTS):
+    # Runs the producer on a background thread and hands items over through a
+    # bounded queue, so producing and consuming overlap while at most maxsize
+    # items are buffered between them. If the consumer stops early or fails,
+    # the producer is told to stop, its iterable is closed and the thread is
+    # joined before the error goes on.
+    items = queue.Queue(maxsize=maxsize)
+    done = object()
+    stop = threading.Event()
+    failure = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put(item):
+                    break
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            put(done)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        while True:
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                break
+        producer.join()
+    if failure:
+        raise failure[0]
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def build_search_query(sub_query):
+    filtered_query = preprocess_query(sub_query)
+    intent = detect_intent(sub_query)
+    return f"{filtered_query} {intent}"
+
+# The load/extract/index/search/plan pipeline behind the REPL in main.py and
+# the service in service.py. The search backend and caches are set up once and
+# kept warm for every query that follows; endpoints are streamed from the spec
+# directory straight into the index rather than held in memory.
+class CopilotEngine:
+    def __init__(self, directory=None, index_name=INDEX_NAME, backend_name=SEARCH_BACKEND,
+                 num_responses=NUM_RESPONSES, max_relevant_apis=MAX_RELEVANT_APIS, shard_by=SHARD_BY):
+        self.directory = directory or os.getcwd()
+        self.index_name = index_name
+        self.backend_name = backend_name
+        self.shard_by = shard_by
+        self.num_responses = num_responses
+        self.max_relevant_apis = max_relevant_apis
+        self.endpoint_count = 0
+        self.backend = None
+        self.search_cache = None
+        self.schemas = SchemaTable()
+        self.dataflow = DataflowGraph()
+        self.lookup = EndpointLookup()
+        self.reranker = Reranker()
+        self.catalog = EndpointCatalog()
+        self.catalog_writer = None
+        self.router = None
+        self.shard_executor = None
+        self.index_versions = {}
+        self.file_stamps = {}
+        self.reload_lock = threading.Lock()
+
+    def load(self):
+        print(f"Initializing {self.backend_name} search backend...")
+        self.backend = create_backend(self.backend_name)
+        print("Search backend initialized successfully.")
+
+        os.makedirs(SPEC_CACHE_DIR, exist_ok=True)
+        self.search_cache = SearchCache(path=SEARCH_CACHE_PATH)
+        if self.shard_by != 'none':
+            self.router = ShardRouter(self.shard_by)
+            self.shard_executor = ThreadPoolExecutor(max_workers=SHARD_WORKERS)
+        self.reload_changed()
+
+    def index_files(self):
+        # The files a sync writes next to the index, as (attribute, path, loader).
+        files = [('schemas', schema_table_path(self.index_name), SchemaTable.load),
+                 ('dataflow', dataflow_path(self.index_name), DataflowGraph.load),
+                 ('lookup', lookup_path(self.index_name), EndpointLookup.load),
+                 ('reranker', rerank_path(self.index_name), Reranker.load),
+                 ('catalog', catalog_path(self.index_name, self.shard_by), EndpointCatalog)]
+        if self.router is not None:
+            files.append(('router', shards_path(self.index_name), lambda path: ShardRouter.load(path, self.shard_by)))
+        return files
+
+    def reload_changed(self):
+        # Like index_version, each file is stat'ed and only re-read when it was
+        # replaced, so a sync by another process sharing the index is picked up
+        # on the next query. A replaced catalog is not closed: searches still
+        # running on other threads may be reading it.
+        with self.reload_lock:
+            for attribute, path, load in self.index_files():
+                stamp = file_stamp(path)
+                if stamp is not None and stamp != self.file_stamps.get(path):
+                    setattr(self, attribute, load(path))
+                    self.file_stamps[path] = stamp
+
+    def record_file_stamps(self):
+        # After this process saved the files itself, nothing needs re-reading.
+        with self.reload_lock:
+            for _, path, _ in self.index_files():
+                self.file_stamps[path] = file_stamp(path)
+
+    def index_exists(self):
+        if self.router is not None:
+            return any(self.backend.index_exists(name) for name in self.router.names())
+        return self.backend.index_exists(self.index_name)
+
+    def iter_endpoints(self, with_source=False):
+        # Yields index documents, or (spec filename, document) pairs.
+        for filename, spec, records in iter_openapi_specifications(self.directory):
+            for record in records:
+                self.endpoint_count += 1
+                self.dataflow.add(record)
+                self.lookup.add(record)
+                self.reranker.add(record)
+                document = record.index_document(self.schemas)
+                if self.catalog_writer is not None:
+                    self.catalog_writer.add(document)
+                yield (filename, document) if with_source else document
+
+    def prepare_index(self, mode='sync'):
+        # mode is 'sync', 'recreate' or 'skip' for an existing index; a missing
+        # index is always created. The schema table is rebuilt from the
+        # endpoints streamed in, so it only holds schemas still in use.
+        self.endpoint_count = 0
+        exists = self.index_exists()
+        if exists and mode not in ('sync', 'recreate'):
+            print("Skipping indexing and moving to search query.")
+            self.endpoint_count = len(self.catalog) or len(self.lookup)
+            return None
+        self.schemas = SchemaTable()
+        self.dataflow = DataflowGraph()
+        self.lookup = EndpointLookup()
+        self.reranker = Reranker()
+        self.catalog_writer = CatalogWriter(catalog_path(self.index_name, self.shard_by))
+        try:
+            with span('index', mode=mode if exists else 'create'):
+                if self.router is not None:
+                    report = self.index_shards(mode)
+                elif not exists:
+                    with closing(prefetch(self.iter_endpoints())) as documents:
+                        report = self.create_and_index_documents(self.index_name, documents)
+                elif mode == 'sync':
+                    with closing(prefetch(self.iter_endpoints())) as documents:
+                        report = self.sync_index(self.index_name, documents)
+                elif mode == 'recreate':
+                    print(f"Deleting index '{self.index_name}'...")
+                    self.backend.delete_index(self.index_name)
+                    print(f"Index '{self.index_name}' deleted successfully.")
+                    with closing(prefetch(self.iter_endpoints())) as documents:
+                        report = self.create_and_index_documents(self.index_name, documents)
+        except BaseException:
+            self.catalog_writer.abort()
+            self.catalog_writer = None
+            # The tables were reset above; the next query reloads the saved ones.
+            self.file_stamps.clear()
+            raise
+        catalog_stats = self.catalog_writer.close()
+        self.catalog_writer = None
+        self.catalog.close()
+        self.catalog = EndpointCatalog(catalog_path(self.index_name, self.shard_by))
+        print(f"Endpoint catalog: {catalog_stats['endpoints']} endpoints in {catalog_stats['bytes']} bytes.")
+        self.schemas.save(schema_table_path(self.index_name))
+        schema_stats = self.schemas.stats()
+        print(f"Interned {schema_stats['references']} schema references as {schema_stats['distinct']} distinct schemas "
+              f"(dedup ratio {schema_stats['dedup_ratio']:.1f}x, {schema_stats['inlined_bytes']} bytes inlined "
+              f"-> {schema_stats['stored_bytes']} bytes stored).")
+        dataflow_stats = self.dataflow.build()
+        self.dataflow.save(dataflow_path(self.index_name))
+        print(f"Dataflow graph: {dataflow_stats['edges']} edges over {dataflow_stats['keys']} identifiers "
+              f"between {dataflow_stats['producers']} producing and {dataflow_stats['consumers']} consuming operations.")
+        self.lookup.save(lookup_path(self.index_name))
+        rerank_stats = self.reranker.build()
+        self.reranker.save(rerank_path(self.index_name))
+        print(f"Re-ranking features: {rerank_stats['bytes']} bytes for {rerank_stats['endpoints']} endpoints.")
+        self.record_file_stamps()
+        if report is not None:
+            report['schemas'] = schema_stats
+            report['dataflow'] = dataflow_stats
+            report['rerank'] = rerank_stats
+            report['catalog'] = catalog_stats
+        peak = peak_memory_mb()
+        print(f"Extracted {self.endpoint_count} endpoints" +
+              (f"; peak memory {peak:.1f} MB." if peak is not None else "."))
+        return report
+
+    def index_shards(self, mode):
+        # Each shard is created or synced on its own. A shard whose documents
+        # hash to the digest recorded last time is not touched, so changing
+        # one spec only re-ingests that spec's shard. The digest is recorded
+        # only once a shard is fully ingested, so a shard with failed batches
+        # is synced again next time.
+        report = {'shards': 0, 'changed': 0, 'unchanged': 0, 'failed': 0, 'deleted': 0, 'documents': 0}
+        seen = set()
+        with closing(prefetch(self.iter_endpoints(with_source=True))) as items:
+            for key, documents in group_documents(items, self.shard_by):
+                name = shard_index_name(self.index_name, key)
+                seen.add(name)
+                report['shards'] += 1
+                report['documents'] += len(documents)
+                digest = shard_digest(documents)
+                exists = self.backend.index_exists(name)
+                if exists and mode == 'recreate':
+                    self.backend.delete_index(name)
+                    exists = False
+                if exists and digest == self.router.digest(name):
+                    report['unchanged'] += 1
+                    continue
+                print(f"Shard '{name}' ({key}): {len(documents)} documents.")
+                with span('index_shard'):
+                    if exists:
+                        shard_report = self.sync_index(name, documents)
+                    else:
+                        shard_report = self.create_and_index_documents(name, documents)
+                if shard_report['failed']:
+                    print(f"Shard '{name}': {shard_report['failed']} documents failed; it will be synced again.")
+                    report['failed'] += 1
+                else:
+                    self.router.update(name, key, documents, digest)
+                report['changed'] += 1
+        for name in [name for name in self.router.names() if name not in seen]:
+            print(f"Deleting shard '{name}': its endpoints are gone.")
+            if self.backend.index_exists(name):
+                self.backend.delete_index(name)
+            self.router.remove(name)
+            report['deleted'] += 1
+        self.router.save(shards_path(self.index_name))
+        if report['changed'] or report['deleted']:
+            self.bump_index_version(self.index_name)
+        print(f"Shards: {report['shards']} ({report['changed']} re-indexed, {report['unchanged']} unchanged, "
+              f"{report['failed']} failed, {report['deleted']} deleted).")
+        return report
+
+    def index_version(self, index_name):
+        # The version file is stat'ed on every call and only re-read when it
+        # was replaced, so a bump by another process is seen on the next query.
+        path = version_path(index_name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return "0"
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        cached = self.index_versions.get(index_name)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            with open(path) as f:
+                version = f.read().strip()
+        except OSError:
+            return "0"
+        self.index_versions[index_name] = (stamp, version)
+        return version
+
+    def bump_index_version(self, index_name):
+        # Cached search results are keyed by this stamp, so bumping it after any
+        # change to the index invalidates them, including in other processes.
+        os.makedirs(SPEC_CACHE_DIR, exist_ok=True)
+        path = version_path(index_name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp_path, path)
+        self.index_versions.pop(index_name, None)
+
+    def index_payload(self, document):
+        if self.catalog_writer is None:
+            return document
+        fields = set(self.backend.tensor_fields).union(INDEX_FIELDS)
+        return {name: value for name, value in document.items() if name in fields}
+
+    def send_batch(self, index_name, batch, batch_number):
+        # Retry transport failures with exponential backoff; per-document errors
+        # reported by the backend are returned rather than retried.
+        for attempt in range(INGEST_RETRIES + 1):
+            try:
+                started = time.perf_counter()
+                errors = self.backend.add_documents(index_name, batch)
+                return time.perf_counter() - started, errors
+            except Exception as e:
+                if attempt == INGEST_RETRIES:
+                    return None, [{'batch': batch_number, 'error': str(e), 'documents': [d.get('_id') for d in batch]}]
+                delay = INGEST_BACKOFF * (2 ** attempt)
+                print(f"Batch {batch_number} failed ({e}); retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def add_documents_in_batches(self, index_name, documents, max_in_flight=INGEST_WORKERS):
+        # documents may be any iterable; batches are cut from it as workers
+        # free up, so a lazy producer is only read as fast as ingest proceeds.
+        documents = iter(documents)
+        report = {'documents': 0, 'indexed': 0, 'failed': 0, 'batches': 0, 'errors': []}
+        batch_size = BATCH_SIZE
+        carry = None
+        exhausted = False
+        started = time.perf_counter()
+        in_flight = {}
+
+        def next_batch():
+            # Cut the next batch at the current size target or byte cap,
+            # whichever comes first.
+            nonlocal carry, exhausted
+            batch = []
+            batch_bytes = 0
+            while len(batch) < batch_size:
+                if carry is not None:
+                    document, size = carry
+                    carry = None
+                else:
+                    document = next(documents, None)
+                    if document is None:
+                        exhausted = True
+                        break
+                    document = self.index_payload(document)
+                    size = len(json.dumps(document))
+                if batch and batch_bytes + size > MAX_BATCH_BYTES:
+                    carry = (document, size)
+                    break
+                batch.append(document)
+                batch_bytes += size
+            return batch, batch_bytes
+
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            while not exhausted or in_flight:
+                while not exhausted and len(in_flight) < max_in_flight:
+                    batch, batch_bytes = next_batch()
+                    if not batch:
+                        break
+                    report['documents'] += len(batch)
+                    report['batches'] += 1
+                    future = executor.submit(self.send_batch, index_name, batch, report['batches'])
+                    in_flight[future] = (report['batches'], batch, batch_bytes)
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_number, batch, batch_bytes = in_flight.pop(future)
+                    latency, errors = future.result()
+                    report['errors'].extend(errors)
+                    if latency is None:
+                        report['failed'] += len(batch)
+                        count('documents_failed', len(batch))
+                        print(f"Batch {batch_number} failed after {INGEST_RETRIES} retries.")
+                        continue
+                    report['failed'] += len(errors)
+                    report['indexed'] += len(batch) - len(errors)
+                    count('documents_indexed', len(batch) - len(errors))
+                    count('documents_failed', len(errors))
+                    count('bytes_sent', batch_bytes)
+                    observe('ingest_batch', latency)
+                    print(f"Indexed batch {batch_number} ({len(batch)} documents) in {latency:.2f}s.")
+                    # Adapt the batch size towards the target latency.
+                    if latency > INGEST_TARGET_LATENCY:
+                        batch_size = max(MIN_BATCH_SIZE, batch_size // 2)
+                    elif latency < INGEST_TARGET_LATENCY / 2:
+                        batch_size = min(MAX_BATCH_SIZE, batch_size + batch_size // 2)
+        elapsed = time.perf_counter() - started
+        report['seconds'] = elapsed
+        report['docs_per_second'] = report['indexed'] / elapsed if elapsed > 0 else 0.0
+        print(f"Ingested {report['indexed']}/{report['documents']} documents in {report['batches']} batches "
+              f"({elapsed:.2f}s, {report['docs_per_second']:.1f} docs/s, {max_in_flight} in flight).")
+        if report['errors']:
+            print(f"{len(report['errors'])} error(s) during ingest:")
+            for error in report['errors']:
+                print(f"  {error}")
+        return report
+
+    def create_and_index_documents(self, index_name, endpoints):
+        print(f"Creating index '{index_name}'...")
+        self.backend.create_index(index_name)
+        print(f"Index '{index_name}' created successfully.")
+        
+        # Index the endpoints in batches. Errors propagate, so prepare_index
+        # discards the half-written catalog and saves nothing.
+        print("Indexing the endpoints...")
+        fingerprints = {}
+
+        def record(endpoints):
+            for endpoint in endpoints:
+                fingerprints[endpoint['_id']] = endpoint['fingerprint']
+                yield endpoint
+
+        report = self.add_documents_in_batches(index_name, record(endpoints))
+        self.backend.refresh(index_name)
+        self.bump_index_version(index_name)
+        save_index_manifest(index_name, fingerprints)
+        return report
+
+    def fetch_indexed_fingerprints(self, index_name, document_ids):
+        indexed = {}
+        for i in range(0, len(document_ids), BATCH_SIZE):
+            batch = document_ids[i:i + BATCH_SIZE]
+            for document_id, document in self.backend.get_documents(index_name, batch).items():
+                indexed[document_id] = document.get('fingerprint')
+        return indexed
+
+    def sync_index(self, index_name, endpoints):
+        # Compare the extracted endpoints with what the index already holds and
+        # only re-embed new or changed documents. Endpoints are checked in
+        # batches as they stream in; backends cannot list an index, so the ids
+        # indexed last time come from the local manifest.
+        print(f"Syncing index '{index_name}'...")
+        manifest = load_index_manifest(index_name)
+        if manifest is None:
+            print("No index manifest found; documents indexed before the first sync cannot be detected for deletion.")
+            manifest = {}
+        report = {'added': 0, 'updated': 0, 'deleted': 0, 'skipped': 0}
+        fingerprints = {}
+
+        def changed_endpoints():
+            batch = []
+            for endpoint in endpoints:
+                fingerprints[endpoint['_id']] = endpoint['fingerprint']
+                batch.append(endpoint)
+                if len(batch) == BATCH_SIZE:
+                    yield from classify(batch)
+                    batch = []
+            yield from classify(batch)
+
+        def classify(batch):
+            if not batch:
+                return
+            indexed = self.fetch_indexed_fingerprints(index_name, [endpoint['_id'] for endpoint in batch])
+            for endpoint in batch:
+                if endpoint['_id'] not in indexed:
+                    report['added'] += 1
+                    yield endpoint
+                elif indexed[endpoint['_id']] != endpoint['fingerprint']:
+                    report['updated'] += 1
+                    yield endpoint
+                else:
+                    report['skipped'] += 1
+
+        # added/updated count what was sent; the ingest report says what the
+        # backend took, with per-batch errors for the rest.
+        report.update(self.add_documents_in_batches(index_name, changed_endpoints()))
+        stale = sorted(document_id for document_id in manifest if document_id not in fingerprints)
+        to_delete = list(self.fetch_indexed_fingerprints(index_name, stale))
+        if to_delete:
+            self.backend.delete_documents(index_name, to_delete)
+            report['deleted'] = len(to_delete)
+        self.backend.refresh(index_name)
+        if report['added'] or report['updated'] or report['deleted']:
+            self.bump_index_version(index_name)
+        save_index_manifest(index_name, fingerprints)
+        print(f"Sync complete: {report['added']} added, {report['updated']} updated, "
+              f"{report['deleted']} deleted, {report['skipped']} unchanged, {report['failed']} failed.")
+        return report
+
+    def search_cache_key(self, sub_query, index_name, num_responses):
+        if self.search_cache is None:
+            return None
+        intent = detect_intent(sub_query)
+        return cache_key(sub_query, intent, num_responses, self.index_version(index_name), self.backend_name,
+                         self.shard_by, self.reranker.state(), self.lookup.filter_string(sub_query, intent))
+
+    def exact_hits(self, sub_query):
+        # Answers a sub-query that names an operationId or a full path from the
+        # lookup tables, fetching the documents by id instead of searching.
+        kind, ids = self.lookup.exact(sub_query, detect_intent(sub_query))
+        if not ids:
+            return None
+        documents = self.fetch_documents(ids)
+        hits = [dict(documents[endpoint_id], _id=endpoint_id, _score=EXACT_MATCH_SCORE, _match=kind)
+                for endpoint_id in ids if endpoint_id in documents]
+        if not hits:
+            return None
+        count('lookups', result='exact')
+        return hits
+
+    def search_filter(self, sub_query):
+        filter_string = self.lookup.filter_string(sub_query, detect_intent(sub_query))
+        count('lookups', result='prefilter' if filter_string else 'none')
+        return filter_string
+
+    def search_relevant_apis(self, sub_query, index_name, num_responses):
+        key = self.search_cache_key(sub_query, index_name, num_responses)
+        if key is not None:
+            hits = self.search_cache.get(key)
+            if hits is not None:
+                count('search_cache', result='hit')
+                return hits
+            count('search_cache', result='miss')
+        hits = self.exact_hits(sub_query)
+        if hits is not None:
+            if key is not None:
+                self.search_cache.put(key, hits)
+            return hits
+        search_query = build_search_query(sub_query)
+        filter_string = self.search_filter(sub_query)
+        limit = self.candidate_limit(num_responses)
+        try:
+            with span('search', backend=self.backend_name):
+                hits = self.backend_search(index_name, search_query, limit, filter_string)
+                if filter_string and not hits:
+                    # The filter was too narrow for what the ranking found.
+                    hits = self.backend_search(index_name, search_query, limit)
+        except Exception as e:
+            count('search_errors')
+            print(f"Error during search: {e}")
+            return []
+        count('search_hits', len(hits))
+        hits = self.hydrate(self.rerank(sub_query, hits, num_responses))
+        if key is not None:
+            self.search_cache.put(key, hits)
+        return hits
+
+    def search_relevant_apis_many(self, sub_queries, index_name, num_responses):
+        keys = [self.search_cache_key(sub_query, index_name, num_responses) for sub_query in sub_queries]
+        results = [self.search_cache.get(key) if key is not None else None for key in keys]
+        missing = [i for i, hits in enumerate(results) if hits is None]
+        if self.search_cache is not None:
+            # Recorded before the early return, so fully cached calls count too.
+            count('search_cache', len(sub_queries) - len(missing), result='hit')
+            count('search_cache', len(missing), result='miss')
+        if not missing:
+            return results
+        for i in missing:
+            results[i] = self.exact_hits(sub_queries[i])
+            if results[i] is not None and keys[i] is not None:
+                self.search_cache.put(keys[i], results[i])
+        missing = [i for i in missing if results[i] is None]
+        if not missing:
+            return results
+        search_queries = [build_search_query(sub_queries[i]) for i in missing]
+        filter_strings = [self.search_filter(sub_queries[i]) for i in missing]
+        limit = self.candidate_limit(num_responses)
+        try:
+            with span('search_many', backend=self.backend_name):
+                found = self.backend_search_many(index_name, search_queries, limit, filter_strings)
+                retry = [j for j, hits in enumerate(found) if filter_strings[j] and not hits]
+                if retry:
+                    unfiltered = self.backend_search_many(index_name, [search_queries[j] for j in retry], limit)
+                    for j, hits in zip(retry, unfiltered):
+                        found[j] = hits
+        except Exception as e:
+            count('search_errors')
+            print(f"Error during search: {e}")
+            found = [[] for _ in missing]
+        else:
+            count('search_hits', sum(len(hits) for hits in found))
+            found = [self.hydrate(self.rerank(sub_queries[i], hits, num_responses)) for i, hits in zip(missing, found)]
+            for i, hits in zip(missing, found):
+                if keys[i] is not None:
+                    self.search_cache.put(keys[i], hits)
+        for i, hits in zip(missing, found):
+            results[i] = hits
+        return results
+
+    def candidate_limit(self, num_responses):
+        return max(num_responses, RERANK_CANDIDATES) if len(self.reranker) else num_responses
+
+    def rerank(self, sub_query, hits, num_responses):
+        if not len(self.reranker):
+            return hits
+        with span('rerank'):
+            return self.reranker.rerank(sub_query, hits, num_responses, detect_intent(sub_query))
+
+    def backend_search(self, index_name, query, limit, filter_string=None):
+        # With shards, the query goes to the shards its terms route it to, in
+        # parallel, and their hits are merged by score.
+        if self.router is None or index_name != self.index_name:
+            return self.backend.search(index_name, query, limit, filter_string)
+        shards = self.router.route(query)
+        count('shards_searched', len(shards))
+        if len(shards) == 1:
+            return self.backend.search(shards[0], query, limit, filter_string)
+        hit_lists = self.shard_executor.map(lambda name: self.backend.search(name, query, limit, filter_string), shards)
+        return merge_by_score(hit_lists, limit)
+
+    def backend_search_many(self, index_name, queries, limit, filter_strings=None):
+        if self.router is None or index_name != self.index_name:
+            return self.backend.search_many(index_name, queries, limit, filter_strings)
+        filter_strings = filter_strings or [None] * len(queries)
+        routed = {}
+        for i, query in enumerate(queries):
+            for name in self.router.route(query):
+                routed.setdefault(name, []).append(i)
+        count('shards_searched', sum(len(positions) for positions in routed.values()))
+
+        def search_shard(name):
+            positions = routed[name]
+            return self.backend.search_many(name, [queries[i] for i in positions], limit,
+                                            [filter_strings[i] for i in positions])
+        hit_lists = [[] for _ in queries]
+        for name, found in zip(routed, self.shard_executor.map(search_shard, routed)):
+            for i, hits in zip(routed[name], found):
+                hit_lists[i].append(hits)
+        return [merge_by_score(lists, limit) for lists in hit_lists]
+
+    def fetch_documents(self, document_ids):
+        # The catalog answers without a backend round trip; ids it lacks are
+        # fetched from the index, which only helps for documents it stores in
+        # full (indexed before the catalog existed). Slim index documents have
+        # no path or responses and are left out.
+        documents = self.catalog.get_many(document_ids)
+        missing = [document_id for document_id in document_ids if document_id not in documents]
+        if not missing:
+            return documents
+        found = {}
+        try:
+            if self.router is not None:
+                for name, shard_ids in self.router.shards_for(missing).items():
+                    found.update(self.backend.get_documents(name, shard_ids))
+            else:
+                found.update(self.backend.get_documents(self.index_name, missing))
+        except Exception as e:
+            print(f"Error fetching documents: {e}")
+        for document_id, document in found.items():
+            if all(field in document for field in DOCUMENT_FIELDS):
+                documents[document_id] = document
+        return documents
+
+    def hydrate(self, hits):
+        # Fills in the fields the index does not store; the hit's own fields
+        # (scores, highlights) are kept. A hit whose document cannot be found
+        # is dropped instead of being passed on without a path or responses.
+        documents = self.fetch_documents([hit['_id'] for hit in hits if hit.get('_id')])
+        hydrated = [dict(documents[hit['_id']], **hit) for hit in hits if hit.get('_id') in documents]
+        if len(hydrated) < len(hits):
+            count('hits_dropped', len(hits) - len(hydrated))
+            print(f"Dropped {len(hits) - len(hydrated)} search hit(s) missing from the endpoint catalog; "
+                  f"re-sync the index to rebuild it.")
+        return hydrated
+
+    def search(self, query):
+        self.reload_changed()
+        with span('query_search'):
+            with span('decompose'):
+                sub_queries = decompose_query(query)
+            count('sub_queries', len(sub_queries))
+            num_responses = self.num_responses
+            if len(self.reranker):
+                num_responses = min(num_responses, RERANK_TOP_K)
+            if self.dataflow.edge_count:
+                num_responses = min(num_responses, DATAFLOW_NUM_RESPONSES)
+            api_chain = construct_api_chain(sub_queries, self.search_relevant_apis, self.index_name, num_responses,
+                                            search_many=self.search_relevant_apis_many,
+                                            graph=self.dataflow if self.dataflow.edge_count else None,
+                                            fetch_documents=self.fetch_documents)
+            with span('merge'):
+                relevant_apis = merge_hits([step['relevant_apis'] for step in api_chain], self.max_relevant_apis)
+        return sub_queries, relevant_apis
+
+    def plan(self, query, use_llm=True, cache_mode='use', token_budget=PROMPT_TOKEN_BUDGET):
+        import asyncio
+        return asyncio.run(self.aplan(query, use_llm, cache_mode, token_budget))
+
+    async def aplan(self, query, use_llm=True, cache_mode='use', token_budget=PROMPT_TOKEN_BUDGET):
+        # Search runs on the default executor so the event loop stays free
+        # while other queries stream from the LLM.
+        import asyncio
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        sub_queries, relevant_apis = await loop.run_in_executor(None, self.search, query)
+        search_seconds = time.perf_counter() - started
+        with span('prompt_build'):
+            prompt, report = build_prompt(relevant_apis, query, token_budget, schemas=self.schemas, dataflow=self.dataflow)
+        result = {
+            'question': query,
+            'sub_queries': sub_queries,
+            'apis': [{
+                'operationId': api.get('operationId'),
+                'method': api.get('method'),
+                'path': api.get('path'),
+                'summary': api.get('summary'),
+                'score': api.get('_fused_score', api.get('_score')),
+            } for api in relevant_apis],
+            'prompt': report,
+            'plan': None,
+            'timings': {'search': search_seconds},
+        }
+        if use_llm:
+            plan, metrics = await get_llm_client().agenerate(prompt, cache_mode=cache_mode)
+            result['plan'] = plan
+            result['llm'] = metrics
+            print(f"LLM latency: {format_metrics(metrics)}")
+        result['timings']['total'] = time.perf_counter() - started
+        observe('query', result['timings']['total'], llm=str(bool(use_llm)).lower())
+        return result
+
+    def stats(self):
+        return {
+            'endpoints': self.endpoint_count,
+            'schemas': len(self.schemas.schemas),
+            'shards': len(self.router) if self.router is not None else None,
+            'search_cache': self.search_cache.stats() if self.search_cache else None,
+        }
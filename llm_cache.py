@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+LLM_CACHE_DIR = ".llm_cache"
+LLM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+LLM_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
+def response_key(model, options, prompt, url=None):
+    # The server URL is part of the key: two servers may serve different
+    # weights under the same model name.
+    content = json.dumps({'url': url, 'model': model, 'options': options or {}, 'prompt': prompt}, sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+# Content-addressed store of generated responses, one JSON file per key.
+# Entries keep the streamed chunks so a hit can be replayed through the same
+# output path. Entries older than max_age are dropped, and the least recently
+# used go first once the directory grows past max_bytes: a file's mtime is
+# when it was written and its atime, set on every hit, when it was last read.
+class ResponseCache:
+    def __init__(self, directory=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES, max_age=LLM_CACHE_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if not isinstance(entry, dict) or not isinstance(entry.get('created'), (int, float)) \
+                or not isinstance(entry.get('chunks'), list) or time.time() - entry['created'] > self.max_age:
+            # Expired, or written by something else: drop it and regenerate.
+            self.remove(path)
+            self.misses += 1
+            return None
+        self.touch(path)
+        self.hits += 1
+        return entry['chunks']
+
+    def touch(self, path):
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+
+    def put(self, key, chunks, model=None):
+        path = self.entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'model': model, 'created': time.time(), 'chunks': chunks}, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        with self.lock:
+            now = time.time()
+            entries = []
+            total = 0
+            for filename in os.listdir(self.directory):
+                if not filename.endswith(".json"):
+                    continue
+                path = os.path.join(self.directory, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self.remove(path)
+                    continue
+                entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+                total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self.remove(path)
+                total -= size
+
+    def clear(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json"):
+                self.remove(os.path.join(self.directory, filename))
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,209 @@
+import json
+import time
+import threading
+from llm_cache import response_key
+from metrics import count, observe
+
+OLLAMA_URL = "http://localhost:11434"
+LLM_MODEL = "llama3"
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 120.0
+POOL_SIZE = 8
+
+class LLMError(Exception):
+    pass
+
+def new_metrics():
+    return {
+        'time_to_first_token': None,
+        'total_latency': None,
+        'tokens': 0,
+        'tokens_per_second': None,
+        'cancelled': False,
+        'cached': False,
+    }
+
+# Client for Ollama's /api/generate NDJSON streaming endpoint. One pooled
+# requests session is kept for the lifetime of the client so repeated calls
+# reuse connections. Each call fills a metrics dict with time to first token,
+# generation throughput and total latency. With a ResponseCache, cache_mode
+# 'use' replays stored responses, 'refresh' regenerates and overwrites them and
+# 'bypass' ignores the cache. requests is imported when the first client is
+# created, so importing this module stays cheap.
+class OllamaClient:
+    def __init__(self, url=OLLAMA_URL, model=LLM_MODEL, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, pool_size=POOL_SIZE, options=None, cache=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.url = url.rstrip('/')
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.options = options or {}
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.last_metrics = None
+
+    def request_body(self, prompt, options=None):
+        body = {"model": self.model, "prompt": prompt, "stream": True}
+        merged_options = dict(self.options, **(options or {}))
+        if merged_options:
+            body["options"] = merged_options
+        return body
+
+    def stream(self, prompt, options=None, cancel_event=None, metrics=None, cache_mode='use'):
+        # Yields response chunks as they arrive. Setting cancel_event stops the
+        # stream and closes the connection.
+        import requests
+        if metrics is None:
+            metrics = new_metrics()
+        self.last_metrics = metrics
+        started = time.perf_counter()
+        first_token = None
+        body = self.request_body(prompt, options)
+        key = None
+        if self.cache is not None and cache_mode != 'bypass':
+            key = response_key(self.model, body.get('options'), prompt, self.url)
+            chunks = self.cache.get(key) if cache_mode == 'use' else None
+            if chunks is not None:
+                metrics['cached'] = True
+                metrics['time_to_first_token'] = time.perf_counter() - started
+                metrics['tokens'] = len(chunks)
+                try:
+                    for chunk in chunks:
+                        if cancel_event is not None and cancel_event.is_set():
+                            metrics['cancelled'] = True
+                            break
+                        yield chunk
+                finally:
+                    # Also reached when the consumer stops reading early.
+                    metrics['total_latency'] = time.perf_counter() - started
+                count('llm_calls', model=self.model, result='cached')
+                return
+        chunks = []
+        completed = False
+        try:
+            with self.session.post(f"{self.url}/api/generate", json=body,
+                                   stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if cancel_event is not None and cancel_event.is_set():
+                        metrics['cancelled'] = True
+                        break
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except ValueError as e:
+                        raise LLMError(f"The LLM sent a malformed response line: {line[:200]!r}") from e
+                    if data.get('error'):
+                        raise LLMError(data['error'])
+                    chunk = data.get("response", "")
+                    if chunk:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                            metrics['time_to_first_token'] = first_token - started
+                        metrics['tokens'] += 1
+                        chunks.append(chunk)
+                        yield chunk
+                    if data.get("done"):
+                        completed = True
+                        # Ollama reports exact counts in the final message.
+                        if data.get('eval_count') and data.get('eval_duration'):
+                            metrics['tokens'] = data['eval_count']
+                            metrics['tokens_per_second'] = data['eval_count'] / (data['eval_duration'] / 1e9)
+                        break
+        except requests.exceptions.RequestException as e:
+            raise LLMError(f"An error occurred while calling the LLM: {e}") from e
+        finally:
+            finished = time.perf_counter()
+            metrics['total_latency'] = finished - started
+            if metrics['tokens_per_second'] is None and first_token is not None and finished > first_token:
+                metrics['tokens_per_second'] = metrics['tokens'] / (finished - first_token)
+            record_call_metrics(self.model, metrics, completed)
+        if key is not None and completed:
+            self.cache.put(key, chunks, self.model)
+
+    def generate(self, prompt, options=None, on_chunk=None, cancel_event=None, cache_mode='use'):
+        metrics = new_metrics()
+        parts = []
+        for chunk in self.stream(prompt, options, cancel_event, metrics, cache_mode):
+            parts.append(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+        return ''.join(parts), metrics
+
+    async def astream(self, prompt, options=None, metrics=None, cache_mode='use'):
+        # Async wrapper over stream(): the blocking HTTP read runs on a worker
+        # thread and hands chunks to the event loop through a queue, so other
+        # coroutines keep running. Cancelling the consumer stops the stream.
+        import asyncio
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancel_event = threading.Event()
+        done = object()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # The loop has gone away after the consumer was cancelled.
+                cancel_event.set()
+
+        def produce():
+            try:
+                for chunk in self.stream(prompt, options, cancel_event, metrics, cache_mode):
+                    put(chunk)
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancel_event.set()
+
+    async def agenerate(self, prompt, options=None, on_chunk=None, cache_mode='use'):
+        metrics = new_metrics()
+        parts = []
+        async for chunk in self.astream(prompt, options, metrics, cache_mode):
+            parts.append(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+        return ''.join(parts), metrics
+
+    def close(self):
+        self.session.close()
+
+def record_call_metrics(model, metrics, completed):
+    # Exports one uncached call to the process-wide metrics registry.
+    result = 'completed' if completed else 'cancelled' if metrics['cancelled'] else 'failed'
+    count('llm_calls', model=model, result=result)
+    count('llm_tokens', metrics['tokens'], model=model)
+    observe('llm_call', metrics['total_latency'], model=model)
+    if metrics['time_to_first_token'] is not None:
+        observe('llm_first_token', metrics['time_to_first_token'], model=model)
+
+def format_metrics(metrics):
+    parts = []
+    if metrics['time_to_first_token'] is not None:
+        parts.append(f"first token {metrics['time_to_first_token']:.2f}s")
+    if metrics['tokens_per_second'] is not None:
+        parts.append(f"{metrics['tokens_per_second']:.1f} tokens/s")
+    if metrics['total_latency'] is not None:
+        parts.append(f"total {metrics['total_latency']:.2f}s")
+    if metrics['cancelled']:
+        parts.append("cancelled")
+    if metrics['cached']:
+        parts.append("from cache")
+    return ', '.join(parts)
@@ -1,8 +1,43 @@
-import requests
-import json
-import pyperclip
+from query_processor import hit_key
+from llm_client import OllamaClient, LLMError, format_metrics
+from llm_cache import ResponseCache
+from endpoint_record import render_prompt_block
+from schema_table import schema_refs
+from dataflow import DATAFLOW_PROMPT_EDGES
+from metrics import span, count
 
-def call_llm(relevant_apis, user_question):
+PROMPT_TOKEN_BUDGET = 6000
+SHARED_SCHEMAS_HEADER = "\nShared Schemas (referenced by id above):\n"
+DATAFLOW_HEADER = "\nData Flow (identifiers one API returns that another needs):\n"
+
+llm_client = None
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text and JSON-ish schemas.
+    return len(text) // 4 + 1
+
+def api_score(api):
+    return api.get('_fused_score', api.get('_score', 0.0))
+
+def format_api_full(api):
+    return render_prompt_block(api, full=True, shared_schemas=True)
+
+def format_api_compact(api):
+    return render_prompt_block(api, full=False)
+
+def format_schema(ref, schemas):
+    return f"  {ref}: {schemas.render(ref)}\n"
+
+def format_edge(edge, dataflow):
+    producer, key, consumer = edge
+    return f"  {dataflow.label(producer)} -> {dataflow.label(consumer)}: {key}\n"
+
+def format_dataflow(edges, dataflow):
+    return DATAFLOW_HEADER + ''.join(format_edge(edge, dataflow) for edge in edges)
+
+def build_prompt(relevant_apis, user_question, token_budget=PROMPT_TOKEN_BUDGET, *, schemas, dataflow=None):
+    # schemas is the SchemaTable the APIs were indexed with: their documents
+    # carry schema ids, which the prompt either inlines or defines once.
     base_prompt = (
         "Given a user input and a set of available APIs in the system, generate a detailed plan to execute a sequence of actions that address and fulfill the user's question. "
         "The plan should include:\n\n"
@@ -15,54 +50,143 @@ def call_llm(relevant_apis, user_question):
         f"User Question: {user_question}\n\n"
         "Available APIs:\n"
     )
-    
-    prompt = base_prompt
+
+    # De-duplicate and rank by search score.
+    unique_apis = {}
     for api in relevant_apis:
-        prompt += f"  - OperationId: {api['operationId']}\n"
-        prompt += f"    Summary: {api['summary']}\n"
-        prompt += f"    Description: {api['description']}\n"
-        prompt += f"    Path: {api['path']}\n"
-        prompt += f"    Method: {api['method']}\n"
-        prompt += f"    Tags: {api['tags']}\n"
-        prompt += f"    Responses: {api['responses']}\n"
-        prompt += f"    Request Body: {api['requestBody']}\n"
-        prompt += "-----\n"
+        key = hit_key(api)
+        if key not in unique_apis or api_score(api) > api_score(unique_apis[key]):
+            unique_apis[key] = api
+    ranked = sorted(unique_apis.values(), key=api_score, reverse=True)
+
+    # First fit as many APIs as possible in compact form, then upgrade the
+    # top-ranked ones to full detail while the budget allows. Full-detail APIs
+    # reference their response and request schemas, and each schema is written
+    # once in a shared section at the end.
+    remaining = token_budget - estimate_tokens(base_prompt)
+    blocks = []
+    omitted = []
+    for api in ranked:
+        block = format_api_compact(api)
+        cost = estimate_tokens(block)
+        if cost <= remaining:
+            blocks.append((api, block, cost))
+            remaining -= cost
+        else:
+            omitted.append(api)
+    # Dataflow edges come next, and only between the APIs that made it in:
+    # each edge is paid for as it is added, in rank order, up to
+    # DATAFLOW_PROMPT_EDGES, so the graph never pushes an API out and what it
+    # does not use is left for full detail.
+    edges = []
+    included = set()
+    for api, _, _ in blocks:
+        included.add(api.get('_id'))
+        if dataflow is None or len(edges) == DATAFLOW_PROMPT_EDGES:
+            continue
+        for edge in dataflow.edges_with(api.get('_id'), included)[:DATAFLOW_PROMPT_EDGES - len(edges)]:
+            edge_cost = estimate_tokens(format_edge(edge, dataflow) if edges else format_dataflow([edge], dataflow))
+            if edge_cost <= remaining:
+                edges.append(edge)
+                remaining -= edge_cost
+    full_count = 0
+    shared = {}
+    schema_references = 0
+    for i, (api, block, cost) in enumerate(blocks):
+        full_block = format_api_full(api)
+        refs = schema_refs(api)
+        definitions = ''.join(format_schema(ref, schemas) for ref in refs if ref not in shared)
+        if definitions and not shared:
+            definitions = SHARED_SCHEMAS_HEADER + definitions
+        extra = estimate_tokens(full_block) - cost + (estimate_tokens(definitions) if definitions else 0)
+        if extra > remaining:
+            break
+        blocks[i] = (api, full_block, cost + extra)
+        remaining -= extra
+        full_count += 1
+        schema_references += len(refs)
+        for ref in refs:
+            shared.setdefault(ref, []).append(i)
+
+    # Schemas that are short or referenced by a single API are cheaper
+    # inlined than defined once and referenced; inlining them only ever
+    # shrinks the prompt, so the budget still holds.
+    for ref, users in list(shared.items()):
+        rendered = schemas.render(ref)
+        if len(set(users)) == 1 or len(rendered) * len(users) <= len(ref) * len(users) + len(format_schema(ref, schemas)):
+            for user in set(users):
+                api, block, cost = blocks[user]
+                blocks[user] = (api, block.replace(ref, rendered), cost)
+            del shared[ref]
+            schema_references -= len(users)
+
+    prompt = base_prompt + ''.join(block for _, block, _ in blocks)
+    if edges:
+        prompt += format_dataflow(edges, dataflow)
+    if shared:
+        prompt += SHARED_SCHEMAS_HEADER + ''.join(format_schema(ref, schemas) for ref in shared)
+    report = {
+        'estimated_tokens': estimate_tokens(prompt),
+        'token_budget': token_budget,
+        'full_detail': full_count,
+        'compact': len(blocks) - full_count,
+        'duplicates_removed': len(relevant_apis) - len(ranked),
+        'shared_schemas': len(shared),
+        'schema_references': schema_references,
+        'dataflow_edges': len(edges),
+        'omitted': [api['operationId'] or f"{api['method'].upper()} {api['path']}" for api in omitted],
+    }
+    count('prompt_tokens', report['estimated_tokens'])
+    count('prompt_apis_omitted', len(omitted))
+    return prompt, report
+
+def get_llm_client():
+    global llm_client
+    if llm_client is None:
+        llm_client = OllamaClient(cache=ResponseCache())
+    return llm_client
+
+def call_llm(relevant_apis, user_question, token_budget=PROMPT_TOKEN_BUDGET, interactive=True, client=None, on_chunk=None, cache_mode='use', *, schemas, dataflow=None):
+    with span('prompt_build'):
+        prompt, report = build_prompt(relevant_apis, user_question, token_budget, schemas=schemas, dataflow=dataflow)
 
     # Print the generated prompt
     print("Generated Prompt:")
     print(prompt)
+    print(f"Estimated prompt tokens: {report['estimated_tokens']} of {report['token_budget']} "
+          f"({report['full_detail']} APIs in full, {report['compact']} compact, "
+          f"{report['duplicates_removed']} duplicates removed).")
+    if report['shared_schemas']:
+        print(f"{report['schema_references']} schema references share {report['shared_schemas']} schema definitions.")
+    if report['omitted']:
+        print(f"Omitted {len(report['omitted'])} APIs over budget: {', '.join(report['omitted'])}")
 
-    # Copy the generated prompt to clipboard
-    pyperclip.copy(prompt)
-    print("The prompt has been copied to the clipboard.")
+    if interactive:
+        # Copy the generated prompt to clipboard
+        try:
+            import pyperclip
+            pyperclip.copy(prompt)
+            print("The prompt has been copied to the clipboard.")
+        except Exception as e:
+            print(f"Could not copy the prompt to the clipboard: {e}")
 
-    # Ask the user if they want to use the LLM
-    use_llm = input("Do you want to use the LLM to generate the sequence? (yes/no): ").strip().lower()
-    if use_llm != 'yes':
-        return "LLM call skipped by the user."
+        # Ask the user if they want to use the LLM
+        use_llm = input("Do you want to use the LLM to generate the sequence? (yes/no): ").strip().lower()
+        if use_llm != 'yes':
+            return "LLM call skipped by the user."
 
-    url = "http://localhost:11434/api/generate"
-    data = {
-        "model": "llama3",
-        "prompt": prompt
-    }
+    if client is None:
+        client = get_llm_client()
+    if on_chunk is None:
+        on_chunk = lambda chunk: print(chunk, end="", flush=True)
 
     response_text = ""
-
     try:
-        with requests.post(url, json=data, stream=True) as response:
-            response.raise_for_status()
-            print("Streaming response:")
-            for line in response.iter_lines():
-                if line:
-                    response_json = line.decode('utf-8')
-                    response_data = json.loads(response_json)
-                    response_part = response_data.get("response", "")
-                    response_text += response_part
-                    print(response_part, end="", flush=True)
-                    if response_data.get("done"):
-                        break
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred while calling the LLM: {e}")
+        print("Streaming response:")
+        response_text, metrics = client.generate(prompt, on_chunk=on_chunk, cache_mode=cache_mode)
+        print()
+        print(f"LLM latency: {format_metrics(metrics)}")
+    except LLMError as e:
+        print(e)
 
     return response_text
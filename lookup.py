@@ -0,0 +1,183 @@
+import os
+import re
+import json
+
+LOOKUP_VERSION = 1
+# Candidate sets up to this size are pushed into the search as an _id filter;
+# larger ones are left to the ranking.
+MAX_FILTER_IDS = 64
+# Methods a detected intent restricts the search to. "get" is left out: its
+# trigger words (what, how, find, ...) start most questions whatever they ask.
+INTENT_METHODS = {
+    'create': ('post',),
+    'update': ('put', 'patch'),
+    'delete': ('delete',),
+}
+PARAMETER = "{}"
+TERMINAL = "$"
+
+PATH_TOKEN = re.compile(r"/[^\s,;'\"]*")
+IDENTIFIER_TOKEN = re.compile(r"[A-Za-z][A-Za-z0-9_\-]{2,}")
+PATH_PARAMETER = re.compile(r"\{[^}]*\}")
+# Tags narrow the search only when named explicitly, as tag:Bookings or
+# tag:"Train Travel"; a query word that happens to equal a tag name is left
+# to the ranking, so "pay for the bookings" still finds the Payments endpoint.
+TAG_TOKEN = re.compile(r'\btag:(?:"([^"]+)"|([^\s,;]+))', re.IGNORECASE)
+
+def path_segments(path):
+    return [PARAMETER if PATH_PARAMETER.fullmatch(segment) else segment.lower()
+            for segment in path.strip('/').split('/') if segment]
+
+def looks_like_identifier(token):
+    # operationIds such as get-trips or GET_ui-api-actions are matched as
+    # tokens; plain words are not, so "search" never short-circuits a query.
+    return '-' in token or '_' in token or any(a.islower() and b.isupper() for a, b in zip(token, token[1:]))
+
+def filter_value(value):
+    # Escapes the characters Marqo's filter syntax treats specially.
+    return re.sub(r'([\\\s():"\[\]{}])', r'\\\1', str(value))
+
+# In-memory lookups over the extracted endpoints, built alongside the index:
+# a trie over path segments (parameters collapse to one wildcard child), a
+# map from operationId to endpoint, and inverted indexes over tags and
+# methods. Exact operationId and path matches answer a query outright; tag:
+# terms, path prefixes and the detected intent narrow the semantic search
+# instead.
+class EndpointLookup:
+    def __init__(self):
+        self.entries = []
+        self.trie = {}
+        self.operation_ids = {}
+        self.tags = {}
+        self.methods = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, record):
+        self.add_entry(record.id, record.method.lower(), record.path, record.operation_id, list(record.tags))
+
+    def add_entry(self, endpoint_id, method, path, operation_id, tags):
+        self.entries.append((endpoint_id, method, path, operation_id, tags))
+        node = self.trie
+        for segment in path_segments(path):
+            node = node.setdefault(segment, {})
+        node.setdefault(TERMINAL, []).append(endpoint_id)
+        if operation_id:
+            self.operation_ids.setdefault(operation_id, []).append(endpoint_id)
+            self.operation_ids.setdefault(operation_id.lower(), []).append(endpoint_id)
+        for tag in tags:
+            self.tags.setdefault(tag.lower(), set()).add(endpoint_id)
+        self.methods.setdefault(method, set()).add(endpoint_id)
+
+    def path_nodes(self, path):
+        # Concrete values such as /bookings/123 also follow the wildcard child.
+        nodes = [self.trie]
+        for segment in path_segments(path):
+            next_nodes = []
+            for node in nodes:
+                if segment == PARAMETER:
+                    # A parameter in the query matches any segment.
+                    next_nodes.extend(child for key, child in node.items() if key != TERMINAL)
+                    continue
+                if segment in node:
+                    next_nodes.append(node[segment])
+                if PARAMETER in node:
+                    next_nodes.append(node[PARAMETER])
+            nodes = next_nodes
+            if not nodes:
+                break
+        return nodes
+
+    def match_path(self, path):
+        return [endpoint_id for node in self.path_nodes(path) for endpoint_id in node.get(TERMINAL, [])]
+
+    def match_path_prefix(self, path):
+        ids = []
+        stack = list(self.path_nodes(path))
+        while stack:
+            node = stack.pop()
+            for key, child in node.items():
+                if key == TERMINAL:
+                    ids.extend(child)
+                else:
+                    stack.append(child)
+        return ids
+
+    def match_operation_id(self, token):
+        return self.operation_ids.get(token) or self.operation_ids.get(token.lower()) or []
+
+    def match_tags(self, query):
+        names = ((quoted or bare).lower() for quoted, bare in TAG_TOKEN.findall(query))
+        return list(dict.fromkeys(name for name in names if name in self.tags))
+
+    def intent_methods(self, intent):
+        return [method for method in INTENT_METHODS.get(intent, ()) if method in self.methods]
+
+    def exact(self, query, intent=None):
+        # Returns (kind, ids) for a query naming an operationId or a full
+        # path, or (None, []) when it has to be searched. A path shared by
+        # several methods is narrowed to the ones the intent implies.
+        stripped = query.strip()
+        for token in IDENTIFIER_TOKEN.findall(stripped):
+            if looks_like_identifier(token) or token == stripped:
+                ids = self.match_operation_id(token)
+                if ids:
+                    return 'operationId', list(dict.fromkeys(ids))
+        for token in PATH_TOKEN.findall(stripped):
+            if len(token) > 1:
+                ids = self.match_path(token)
+                methods = self.intent_methods(intent)
+                if methods:
+                    ids = [endpoint_id for endpoint_id in ids
+                           if any(endpoint_id in self.methods[method] for method in methods)] or ids
+                if ids:
+                    return 'path', list(dict.fromkeys(ids))
+        return None, []
+
+    def candidates(self, query, intent=None):
+        # Narrows a search: ids from path prefixes and tag: terms in the query,
+        # and the methods the intent implies. None means unrestricted.
+        ids = None
+        for token in PATH_TOKEN.findall(query):
+            if len(token) > 1:
+                prefix_ids = set(self.match_path_prefix(token))
+                if prefix_ids:
+                    ids = prefix_ids if ids is None else ids | prefix_ids
+        tags = self.match_tags(query)
+        if tags:
+            tag_ids = set().union(*(self.tags[tag] for tag in tags))
+            ids = tag_ids if ids is None else ids | tag_ids
+        return ids, self.intent_methods(intent)
+
+    def filter_string(self, query, intent=None):
+        # Marqo filter syntax, e.g. (method:(post)) AND (_id:(a) OR _id:(b)).
+        ids, methods = self.candidates(query, intent)
+        groups = []
+        if methods:
+            groups.append(" OR ".join(f"method:({filter_value(method)})" for method in methods))
+        if ids is not None and len(ids) <= MAX_FILTER_IDS:
+            groups.append(" OR ".join(f"_id:({filter_value(endpoint_id)})" for endpoint_id in sorted(ids)))
+        if not groups:
+            return None
+        return " AND ".join(f"({group})" for group in groups)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': LOOKUP_VERSION, 'entries': self.entries}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        lookup = cls()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return lookup
+        if data.get('version') == LOOKUP_VERSION:
+            for entry in data['entries']:
+                lookup.add_entry(*entry)
+        return lookup
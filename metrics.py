@@ -0,0 +1,199 @@
+import os
+import io
+import time
+import json
+import threading
+from collections import deque
+
+METRICS_ENABLED = os.environ.get("COPILOT_METRICS", "").lower() in ("1", "true", "yes")
+METRICS_PREFIX = "copilot"
+RECENT_SPANS = 256
+PROFILE_LINES = 25
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.parent = None
+        self.started = None
+
+    def __enter__(self):
+        stack = self.registry.stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.started
+        stack = self.registry.stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self.registry.observe(self.name, seconds, **self.labels)
+        self.registry.record_span(self.name, self.labels, self.parent, seconds, exc_type is not None)
+        return False
+
+def metric_key(name, labels):
+    return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+# Process-wide counters, timers and recent spans. When disabled, span()
+# hands back a shared no-op context manager and count()/observe() return
+# straight away, so instrumented code pays one attribute check per call.
+class Metrics:
+    def __init__(self, enabled=METRICS_ENABLED, recent_spans=RECENT_SPANS):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.counters = {}
+        self.timers = {}
+        self.spans = deque(maxlen=recent_spans)
+
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def span(self, name, **labels):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, labels)
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self.lock:
+            timer = self.timers.get(key)
+            if timer is None:
+                timer = self.timers[key] = {'count': 0, 'sum': 0.0, 'max': 0.0}
+            timer['count'] += 1
+            timer['sum'] += seconds
+            timer['max'] = max(timer['max'], seconds)
+
+    def record_span(self, name, labels, parent, seconds, failed):
+        with self.lock:
+            self.spans.append({'name': name, 'labels': labels, 'parent': parent, 'seconds': seconds,
+                               'failed': failed, 'thread': threading.current_thread().name})
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.timers.clear()
+            self.spans.clear()
+
+    def export_json(self):
+        with self.lock:
+            return {
+                'counters': [dict(name=name, labels=dict(labels), value=value)
+                             for (name, labels), value in sorted(self.counters.items())],
+                'timers': [dict(name=name, labels=dict(labels), **timer)
+                           for (name, labels), timer in sorted(self.timers.items())],
+                'spans': list(self.spans),
+            }
+
+    def export_prometheus(self, prefix=METRICS_PREFIX):
+        # Counters become <prefix>_<name>_total and timers summaries in seconds.
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (counter_name, labels), value in counters:
+                if counter_name == name:
+                    lines.append(f"{prefix}_{name}_total{format_labels(labels)} {value}")
+        for name in sorted({name for (name, _), _ in timers}):
+            lines.append(f"# TYPE {prefix}_{name}_seconds summary")
+            for (timer_name, labels), timer in timers:
+                if timer_name == name:
+                    lines.append(f"{prefix}_{name}_seconds_count{format_labels(labels)} {timer['count']}")
+                    lines.append(f"{prefix}_{name}_seconds_sum{format_labels(labels)} {timer['sum']:.6f}")
+            lines.append(f"# TYPE {prefix}_{name}_seconds_max gauge")
+            for (timer_name, labels), timer in timers:
+                if timer_name == name:
+                    lines.append(f"{prefix}_{name}_seconds_max{format_labels(labels)} {timer['max']:.6f}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            if path.endswith(".prom"):
+                f.write(self.export_prometheus())
+            else:
+                json.dump(self.export_json(), f, indent=2)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+metrics = Metrics()
+
+def enable(enabled=True):
+    metrics.enabled = enabled
+
+# The module-level helpers check the flag themselves so the disabled path
+# skips the method call as well.
+def span(name, **labels):
+    if not metrics.enabled:
+        return NULL_SPAN
+    return Span(metrics, name, labels)
+
+def count(name, value=1, **labels):
+    if metrics.enabled:
+        metrics.count(name, value, **labels)
+
+def observe(name, seconds, **labels):
+    if metrics.enabled:
+        metrics.observe(name, seconds, **labels)
+
+def profile_call(function, *args, cpu=True, memory=True, lines=PROFILE_LINES, **kwargs):
+    # Runs one call under cProfile and/or tracemalloc and returns its result
+    # with a text report of the hottest functions and largest allocations.
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    profiler = cProfile.Profile() if cpu else None
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        snapshot = tracemalloc.take_snapshot() if memory else None
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+        if started_tracing:
+            tracemalloc.stop()
+
+    report = io.StringIO()
+    if profiler is not None:
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(lines)
+    if snapshot is not None:
+        report.write(f"Peak traced memory: {peak / (1024 * 1024):.1f} MB\n")
+        report.write(f"Top {lines} allocation sites:\n")
+        for stat in snapshot.statistics('lineno')[:lines]:
+            report.write(f"  {stat}\n")
+    return result, report.getvalue()
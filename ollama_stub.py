@@ -0,0 +1,69 @@
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal stand-in for Ollama's /api/generate endpoint. It streams a canned
+# reply as NDJSON, one word per line, so the LLM client can be exercised
+# without a model. Run it directly (python ollama_stub.py [port]) or start it
+# in-process with start_stub_server().
+STUB_REPLY = "1. Call the search API. 2. Pick a result. 3. Call the booking API with its id."
+
+class StubHandler(BaseHTTPRequestHandler):
+    reply = STUB_REPLY
+    chunk_delay = 0.0
+    first_token_delay = 0.0
+    requests_seen = []
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        type(self).requests_seen.append(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        time.sleep(self.first_token_delay)
+        started = time.perf_counter()
+        words = self.reply.split(' ')
+        try:
+            for i, word in enumerate(words):
+                chunk = word if i == 0 else f" {word}"
+                self.write_line({"model": body.get("model"), "response": chunk, "done": False})
+                time.sleep(self.chunk_delay)
+            self.write_line({"model": body.get("model"), "response": "", "done": True,
+                             "eval_count": len(words), "eval_duration": int((time.perf_counter() - started) * 1e9)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def write_line(self, data):
+        self.wfile.write(json.dumps(data).encode('utf-8') + b"\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port=0, reply=STUB_REPLY, chunk_delay=0.0, first_token_delay=0.0):
+    # Returns the running server and its base URL; call server.shutdown() to stop.
+    handler = type('ConfiguredStubHandler', (StubHandler,), {
+        'reply': reply,
+        'chunk_delay': chunk_delay,
+        'first_token_delay': first_token_delay,
+        'requests_seen': [],
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 11434
+    server, url = start_stub_server(port, chunk_delay=0.05, first_token_delay=0.2)
+    print(f"Ollama stub listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
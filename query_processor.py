@@ -1,11 +1,20 @@
 import re
-import nltk
-from nltk.corpus import stopwords
+from concurrent.futures import ThreadPoolExecutor
+from stop_words import ENGLISH_STOP_WORDS
 
-# Download NLTK stop words
-nltk.download('stopwords')
+STOP_WORDS = ENGLISH_STOP_WORDS
+SEARCH_WORKERS = 8
+RRF_K = 60
 
-STOP_WORDS = set(stopwords.words('english'))
+# Compiled once at import; checked in order, first match wins.
+INTENT_PATTERNS = [
+    (re.compile(r'\b(what|which|who|where|when|how|find|show|get)\b'), "get"),
+    (re.compile(r'\b(create|add|make|insert|post|register)\b'), "create"),
+    (re.compile(r'\b(update|edit|modify|put|change)\b'), "update"),
+    (re.compile(r'\b(delete|remove|erase|cancel|destroy)\b'), "delete"),
+]
+CONNECTORS = ("and", "then", "next", "after that")
+DECOMPOSE_PATTERN = re.compile(r'\b(and|then|next|after that)\b', re.IGNORECASE)
 
 def preprocess_query(query):
     query_tokens = query.split()
@@ -15,24 +24,18 @@ def preprocess_query(query):
 
 def detect_intent(query):
     query = query.lower()
-    if re.search(r'\b(what|which|who|where|when|how|find|show|get)\b', query):
-        return "get"
-    elif re.search(r'\b(create|add|make|insert|post|register)\b', query):
-        return "create"
-    elif re.search(r'\b(update|edit|modify|put|change)\b', query):
-        return "update"
-    elif re.search(r'\b(delete|remove|erase|cancel|destroy)\b', query):
-        return "delete"
-    else:
-        return "unknown"
+    for pattern, intent in INTENT_PATTERNS:
+        if pattern.search(query):
+            return intent
+    return "unknown"
 
 def decompose_query(query):
-    parts = re.split(r'\b(and|then|next|after that)\b', query, flags=re.IGNORECASE)
+    parts = DECOMPOSE_PATTERN.split(query)
     sub_queries = []
     base_query = ""
     for part in parts:
         part = part.strip()
-        if part.lower() in ["and", "then", "next", "after that"]:
+        if part.lower() in CONNECTORS:
             base_query = sub_queries[-1] if sub_queries else query
         else:
             if base_query:
@@ -41,13 +44,43 @@ def decompose_query(query):
                 sub_queries.append(part)
     return sub_queries
 
-def construct_api_chain(sub_queries, search_relevant_apis, index_name, num_responses):
+def construct_api_chain(sub_queries, search_relevant_apis, index_name, num_responses, search_many=None,
+                        graph=None, fetch_documents=None):
+    # Sub-queries are searched concurrently, either in one bulk call through
+    # search_many or on a thread pool, so latency is bounded by the slowest one.
+    # With a dataflow graph, each step is then re-ranked, pruned and extended
+    # with the producers of the identifiers it needs.
+    if search_many is not None:
+        results = search_many(sub_queries, index_name, num_responses)
+    elif len(sub_queries) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(sub_queries), SEARCH_WORKERS)) as executor:
+            results = list(executor.map(lambda sub_query: search_relevant_apis(sub_query, index_name, num_responses), sub_queries))
+    else:
+        results = [search_relevant_apis(sub_query, index_name, num_responses) for sub_query in sub_queries]
     api_chain = []
-    for sub_query in sub_queries:
-        relevant_apis = search_relevant_apis(sub_query, index_name, num_responses)
+    for sub_query, relevant_apis in zip(sub_queries, results):
         api_chain.append({
             'sub_query': sub_query,
             'relevant_apis': relevant_apis
         })
+    if graph is not None and fetch_documents is not None:
+        from dataflow import expand_chain
+        expand_chain(api_chain, graph, fetch_documents, num_responses)
     return api_chain
 
+def hit_key(hit):
+    return hit.get('_id') or (hit.get('method'), hit.get('path'), hit.get('operationId'))
+
+def merge_hits(hit_lists, top_k, rrf_k=RRF_K):
+    # Reciprocal rank fusion: an endpoint returned for several sub-queries is
+    # kept once and ranked by the sum of 1 / (rrf_k + rank) over those lists.
+    merged = {}
+    fused_scores = {}
+    for hits in hit_lists:
+        for rank, hit in enumerate(hits, start=1):
+            key = hit_key(hit)
+            if key not in merged:
+                merged[key] = hit
+            fused_scores[key] = fused_scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    ranked = sorted(merged, key=lambda key: fused_scores[key], reverse=True)[:top_k]
+    return [dict(merged[key], _fused_score=fused_scores[key]) for key in ranked]
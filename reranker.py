@@ -0,0 +1,132 @@
+import os
+import zlib
+from search_backend import tokenize
+from stop_words import ENGLISH_STOP_WORDS
+from dataflow import singular, static_segments
+
+RERANK_VERSION = 1
+# Bits per token channel; tokens are hashed into them, so the feature matrix
+# costs 3 * RERANK_DIM / 8 bytes per endpoint.
+RERANK_DIM = 256
+METHODS = ("get", "post", "put", "patch", "delete")
+# As in lookup.py, "get" is left out: its trigger words (what, how, find, ...)
+# start most questions whatever they ask, and decompose_query carries "find"
+# into sub-queries such as "find book it".
+INTENT_METHODS = {
+    'create': ("post",),
+    'update': ("put", "patch"),
+    'delete': ("delete",),
+}
+# Weights of (search score / best score, method agrees with intent, query
+# tokens found in tags, in static path segments, in 2xx response and request
+# body field names). Hand-tuned against the recall that `python benchmark.py`
+# reports on train_travel_queries.jsonl.
+RERANK_WEIGHTS = (1.0, 0.6, 0.6, 0.4, 0.2)
+
+def feature_tokens(text):
+    return {singular(token) for token in tokenize(text) if token not in ENGLISH_STOP_WORDS}
+
+def token_bits(tokens, dim=RERANK_DIM):
+    return {zlib.crc32(token.encode('utf-8')) % dim for token in tokens}
+
+def record_channels(record):
+    # The three token channels of an endpoint: tags, path and field names.
+    tags = set().union(*(feature_tokens(tag) for tag in record.tags))
+    path = set().union(*(feature_tokens(segment) for segment in static_segments(record.path)))
+    fields = set()
+    for status, pairs in record.responses:
+        if status.startswith('2'):
+            fields.update(*(feature_tokens(name) for name, _ in pairs))
+    fields.update(*(feature_tokens(name) for name, _ in record.request_body))
+    return tags, path, fields
+
+# Second-stage ranking over the hits a search returns. Every endpoint gets a
+# bit-packed feature row at extraction time (its hashed tag, path and field
+# name tokens plus its method), so re-ranking a candidate set is one gather,
+# one unpack and one matrix product over a handful of rows. numpy is imported
+# where it is used.
+class Reranker:
+    def __init__(self, dim=RERANK_DIM):
+        self.dim = dim
+        self.ids = []
+        self.rows = {}
+        self.features = None
+        self.methods = None
+        self.pending = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def state(self):
+        # Identifies what rerank() would do, for keys of cached results.
+        if not self.ids:
+            return None
+        return f"{RERANK_VERSION}:{self.dim}:{len(self.ids)}:{','.join(map(str, RERANK_WEIGHTS))}"
+
+    def add(self, record):
+        method = record.method.lower()
+        self.pending.append((record.id, METHODS.index(method) if method in METHODS else -1,
+                             [token_bits(tokens, self.dim) for tokens in record_channels(record)]))
+
+    def build(self):
+        import numpy as np
+        dense = np.zeros((len(self.pending), 3 * self.dim), dtype=np.uint8)
+        for i, (_, _, channels) in enumerate(self.pending):
+            for channel, bits in enumerate(channels):
+                dense[i, [channel * self.dim + bit for bit in bits]] = 1
+        self.ids = [endpoint_id for endpoint_id, _, _ in self.pending]
+        self.rows = {endpoint_id: i for i, endpoint_id in enumerate(self.ids)}
+        self.features = np.packbits(dense, axis=1)
+        self.methods = np.array([method for _, method, _ in self.pending], dtype=np.int8)
+        self.pending = []
+        return {'endpoints': len(self.ids), 'bytes': self.features.nbytes + self.methods.nbytes}
+
+    def rerank(self, query, hits, top_k, intent='unknown', weights=RERANK_WEIGHTS):
+        # Returns the top_k hits by the weighted feature score, which replaces
+        # _score; the search engine's score is kept as _search_score.
+        import numpy as np
+        if not hits or not self.ids:
+            return hits[:top_k]
+        query_vector = np.zeros(self.dim, dtype=np.float32)
+        query_vector[list(token_bits(feature_tokens(query), self.dim))] = 1.0
+        positions = np.array([self.rows.get(hit.get('_id'), -1) for hit in hits])
+        known = positions >= 0
+        positions[~known] = 0
+        rows = np.unpackbits(self.features[positions], axis=1)[:, :3 * self.dim]
+        overlap = rows.reshape(len(hits), 3, self.dim).astype(np.float32) @ query_vector
+        overlap /= max(query_vector.sum(), 1.0)
+        # Indexed by method number; the extra last entry catches unknown (-1).
+        agrees = np.zeros(len(METHODS) + 1, dtype=np.float32)
+        agrees[[METHODS.index(method) for method in INTENT_METHODS.get(intent, ())]] = 1.0
+        method = agrees[self.methods[positions]]
+        scores = np.array([hit.get('_score', 0.0) for hit in hits], dtype=np.float32)
+        best = scores.max()
+        features = np.column_stack([scores / best if best > 0 else scores, method, overlap])
+        features[~known, 1:] = 0.0
+        combined = features @ np.asarray(weights, dtype=np.float32)
+        order = np.argsort(-combined, kind='stable')[:top_k]
+        return [dict(hits[i], _score=float(combined[i]), _search_score=hits[i].get('_score')) for i in order]
+
+    def save(self, path):
+        import numpy as np
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, version=RERANK_VERSION, dim=self.dim, ids=np.array(self.ids, dtype=str),
+                 features=self.features, methods=self.methods)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+        try:
+            with np.load(path) as arrays:
+                if int(arrays['version']) != RERANK_VERSION:
+                    return cls()
+                reranker = cls(int(arrays['dim']))
+                reranker.ids = arrays['ids'].tolist()
+                reranker.features = arrays['features']
+                reranker.methods = arrays['methods']
+        except (OSError, ValueError, KeyError):
+            return cls()
+        reranker.rows = {endpoint_id: i for i, endpoint_id in enumerate(reranker.ids)}
+        return reranker
@@ -0,0 +1,82 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from endpoint_record import render_fields
+
+SCHEMA_REF = re.compile(r"@S[0-9a-f]{10}")
+
+def schema_id(fields):
+    content = json.dumps(fields)
+    return "@S" + hashlib.sha1(content.encode('utf-8')).hexdigest()[:10]
+
+# Side table of flattened response/request schemas. Each distinct tuple of
+# (field, description) pairs is stored once under a content-derived id, and
+# index documents carry the id instead of the inlined fields. Every reference
+# is counted so the ingest report can show how much inlining was avoided.
+class SchemaTable:
+    def __init__(self, schemas=None):
+        self.schemas = dict(schemas or {})
+        self.ids = {fields: ref for ref, fields in self.schemas.items()}
+        self.references = 0
+        self.inlined_bytes = 0
+        self.lock = threading.Lock()
+
+    def intern(self, fields):
+        if not fields:
+            return None
+        fields = tuple(tuple(pair) for pair in fields)
+        with self.lock:
+            ref = self.ids.get(fields)
+            if ref is None:
+                ref = self.ids[fields] = schema_id(fields)
+                self.schemas[ref] = fields
+            self.references += 1
+            self.inlined_bytes += len(render_fields(fields))
+        return ref
+
+    def get(self, ref):
+        return self.schemas.get(ref)
+
+    def render(self, ref):
+        fields = self.schemas.get(ref)
+        return render_fields(fields) if fields is not None else ref
+
+    def expand(self, text):
+        # Replace references with the inlined fields, for output that has no
+        # shared schema section.
+        return SCHEMA_REF.sub(lambda match: self.render(match.group(0)), text)
+
+    def stats(self):
+        distinct = len(self.ids)
+        stored_bytes = sum(len(render_fields(fields)) for fields in self.ids)
+        return {
+            'references': self.references,
+            'distinct': distinct,
+            'dedup_ratio': self.references / distinct if distinct else 1.0,
+            'inlined_bytes': self.inlined_bytes,
+            'stored_bytes': stored_bytes,
+        }
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.schemas, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as f:
+                schemas = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        return cls({ref: tuple(tuple(pair) for pair in fields) for ref, fields in schemas.items()})
+
+def schema_refs(api):
+    refs = SCHEMA_REF.findall(api.get('responses', ''))
+    if api.get('requestBodySchema'):
+        refs.append(api['requestBodySchema'])
+    return list(dict.fromkeys(refs))
@@ -0,0 +1,360 @@
+import os
+import re
+import json
+import uuid
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+TENSOR_FIELDS = ["summary", "description", "operationId", "requestBody", "tags"]
+MARQO_URL = "http://localhost:8882"
+LOCAL_INDEX_DIR = ".local_index"
+SEARCH_WORKERS = 8
+# Status codes meaning the server has no bulk search endpoint.
+BULK_SEARCH_UNSUPPORTED = (404, 405)
+BULK_SEARCH_ATTEMPTS = 2
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+CAMEL_CASE_PATTERN = re.compile(r'([a-z0-9])([A-Z])')
+FILTER_TERM = re.compile(r'([A-Za-z_][\w.]*):\(((?:\\.|[^\\)])*)\)')
+FILTER_ESCAPE = re.compile(r'\\(.)')
+
+def tokenize(text):
+    # Split camelCase identifiers such as operationIds before lower-casing.
+    return TOKEN_PATTERN.findall(CAMEL_CASE_PATTERN.sub(r'\1 \2', text).lower())
+
+def parse_filter(filter_string):
+    # Reads the subset of Marqo's filter syntax the lookup layer emits: an AND
+    # of parenthesised OR-groups of field:(value) terms. Returns a list of
+    # groups, each a list of (field, value) pairs.
+    groups = []
+    for group in re.split(r'\)\s+AND\s+\(', filter_string.strip()[1:-1]):
+        terms = [(field, FILTER_ESCAPE.sub(r'\1', value)) for field, value in FILTER_TERM.findall(group)]
+        if terms:
+            groups.append(terms)
+    return groups
+
+# Interface shared by the search backends. Hits are returned in Marqo's hit
+# format (document fields plus '_id' and '_score') so callers do not need to
+# know which backend produced them.
+class SearchBackend(ABC):
+    tensor_fields = TENSOR_FIELDS
+
+    @abstractmethod
+    def index_exists(self, index_name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_index(self, index_name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_index(self, index_name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_documents(self, index_name, documents):
+        # Returns the list of per-document errors, empty on success.
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_documents(self, index_name, document_ids):
+        # Returns {document_id: document} for the ids that are indexed.
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_documents(self, index_name, document_ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, index_name, query, limit, filter_string=None):
+        # filter_string uses Marqo's filter syntax and restricts the candidates.
+        raise NotImplementedError
+
+    def search_many(self, index_name, queries, limit, filter_strings=None):
+        # Returns one hit list per query, in order; filter_strings, when given,
+        # holds one filter (or None) per query.
+        filter_strings = filter_strings or [None] * len(queries)
+        if len(queries) <= 1:
+            return [self.search(index_name, query, limit, filter_string)
+                    for query, filter_string in zip(queries, filter_strings)]
+        with ThreadPoolExecutor(max_workers=min(len(queries), SEARCH_WORKERS)) as executor:
+            return list(executor.map(lambda item: self.search(index_name, item[0], limit, item[1]),
+                                     zip(queries, filter_strings)))
+
+    def refresh(self, index_name):
+        pass
+
+class MarqoBackend(SearchBackend):
+    def __init__(self, url=MARQO_URL):
+        import marqo
+        self.mq = marqo.Client(url=url)
+        self.bulk_search_supported = True
+
+    def index_exists(self, index_name):
+        existing_indices = self.mq.get_indexes()
+        return any(index['indexName'] == index_name for index in existing_indices['results'])
+
+    def create_index(self, index_name):
+        self.mq.create_index(index_name)
+
+    def delete_index(self, index_name):
+        self.mq.index(index_name).delete()
+
+    def add_documents(self, index_name, documents):
+        response = self.mq.index(index_name).add_documents(documents, tensor_fields=self.tensor_fields)
+        if not response.get('errors'):
+            return []
+        return [item for item in response.get('items', []) if item.get('error') or item.get('status', 200) >= 400]
+
+    def get_documents(self, index_name, document_ids):
+        response = self.mq.index(index_name).get_documents(document_ids=document_ids)
+        return {document['_id']: document for document in response['results'] if document.get('_found')}
+
+    def delete_documents(self, index_name, document_ids):
+        self.mq.index(index_name).delete_documents(ids=document_ids)
+
+    def search(self, index_name, query, limit, filter_string=None):
+        return self.mq.index(index_name).search(q=query, limit=limit, filter_string=filter_string)['hits']
+
+    def search_many(self, index_name, queries, limit, filter_strings=None):
+        # Use Marqo's bulk search endpoint when the server provides it (it was
+        # removed in Marqo 2) and fall back to concurrent single searches.
+        # Only a 404/405 turns bulk search off for good; any other failure is
+        # retried once and then this call falls back on its own.
+        if len(queries) > 1 and self.bulk_search_supported:
+            filter_strings = filter_strings or [None] * len(queries)
+            searches = [dict({'index': index_name, 'q': query, 'limit': limit}, **({'filter': filter_string} if filter_string else {}))
+                        for query, filter_string in zip(queries, filter_strings)]
+            for attempt in range(BULK_SEARCH_ATTEMPTS):
+                try:
+                    response = self.mq.bulk_search(searches)
+                    return [result['hits'] for result in response['result']]
+                except Exception as e:
+                    if getattr(e, 'status_code', None) in BULK_SEARCH_UNSUPPORTED:
+                        print(f"Marqo has no bulk search endpoint (HTTP {e.status_code}); searching one query at a time.")
+                        self.bulk_search_supported = False
+                        break
+                    print(f"Bulk search failed (attempt {attempt + 1} of {BULK_SEARCH_ATTEMPTS}): {e}")
+        return super().search_many(index_name, queries, limit, filter_strings)
+
+# One build of a LocalIndex: BM25 over the concatenated tensor fields, stored
+# as term-major postings (term_ptr[t]:term_ptr[t + 1] slices postings_doc and
+# postings_tf) so a query is scored with one vectorized update per query term.
+# A snapshot is never modified after it is built (except for its lazily
+# filled filter index), so searches can score it without holding a lock while
+# a writer builds the next one.
+class Postings:
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, doc_ids, documents, vocabulary, term_ptr, postings_doc, postings_tf, doc_length, idf):
+        self.doc_ids = doc_ids
+        self.documents = documents
+        self.doc_index = {document_id: i for i, document_id in enumerate(doc_ids)}
+        self.field_index = {}
+        self.vocabulary = vocabulary
+        self.term_ptr = term_ptr
+        self.postings_doc = postings_doc
+        self.postings_tf = postings_tf
+        self.doc_length = doc_length
+        self.idf = idf
+
+    @classmethod
+    def build(cls, documents, document_text):
+        import numpy as np
+        doc_ids = list(documents)
+        vocabulary = {}
+        postings = []
+        doc_length = np.zeros(len(doc_ids), dtype=np.float32)
+        for doc_index, document_id in enumerate(doc_ids):
+            counts = {}
+            tokens = tokenize(document_text(documents[document_id]))
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            doc_length[doc_index] = len(tokens)
+            for token, count in counts.items():
+                term = vocabulary.setdefault(token, len(vocabulary))
+                postings.append((term, doc_index, count))
+        postings.sort()
+        terms = np.array([p[0] for p in postings], dtype=np.int64)
+        term_ptr = np.searchsorted(terms, np.arange(len(vocabulary) + 1)).astype(np.int64)
+        document_frequency = np.diff(term_ptr).astype(np.float32)
+        n = len(doc_ids)
+        idf = np.log(1.0 + (n - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        return cls(doc_ids, [documents[document_id] for document_id in doc_ids], vocabulary, term_ptr,
+                   np.array([p[1] for p in postings], dtype=np.int32),
+                   np.array([p[2] for p in postings], dtype=np.float32), doc_length, idf)
+
+    def field_positions(self, field):
+        # {value: [doc positions]} for one field, built the first time a filter
+        # names it. Two searches racing here compute the same dict.
+        positions = self.field_index.get(field)
+        if positions is None:
+            positions = {}
+            for i, document_id in enumerate(self.doc_ids):
+                value = document_id if field == '_id' else str(self.documents[i].get(field, ''))
+                positions.setdefault(value, []).append(i)
+            self.field_index[field] = positions
+        return positions
+
+    def allowed(self, filter_string):
+        # Boolean mask of the documents a filter admits.
+        import numpy as np
+        mask = np.ones(len(self.doc_ids), dtype=bool)
+        for terms in parse_filter(filter_string):
+            group = np.zeros(len(self.doc_ids), dtype=bool)
+            for field, value in terms:
+                if field == '_id':
+                    if value in self.doc_index:
+                        group[self.doc_index[value]] = True
+                else:
+                    group[self.field_positions(field).get(value, [])] = True
+            mask &= group
+        return mask
+
+    def search(self, query, limit, filter_string=None):
+        import numpy as np
+        if not self.doc_ids:
+            return []
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        average_length = float(self.doc_length.mean()) or 1.0
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_length / average_length)
+        for token in set(tokenize(query)):
+            term = self.vocabulary.get(token)
+            if term is None:
+                continue
+            start, end = self.term_ptr[term], self.term_ptr[term + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end]
+            scores[docs] += self.idf[term] * tf * (self.k1 + 1.0) / (tf + norm[docs])
+        if filter_string:
+            scores[~self.allowed(filter_string)] = 0.0
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+        return [dict(self.documents[i], _id=self.doc_ids[i], _score=float(scores[i]), _highlights=[])
+                for i in matched]
+
+# The documents of one local index plus the Postings built from them. Writers
+# change the documents and mark the index dirty; the next search rebuilds the
+# postings. numpy is imported where it is used so the Marqo path never loads
+# it.
+class LocalIndex:
+    def __init__(self, tensor_fields):
+        self.tensor_fields = tensor_fields
+        self.documents = {}
+        self.dirty = True
+        self.postings = None
+
+    def document_text(self, document):
+        return ' '.join(str(document.get(field, '')) for field in self.tensor_fields)
+
+    def build(self):
+        self.postings = Postings.build(self.documents, self.document_text)
+        self.dirty = False
+        return self.postings
+
+    def current(self):
+        # The postings to search; callers sharing the index hold its lock.
+        return self.build() if self.dirty else self.postings
+
+    def search(self, query, limit, filter_string=None):
+        return self.current().search(query, limit, filter_string)
+
+    def save(self, path):
+        import numpy as np
+        postings = self.current()
+        os.makedirs(path, exist_ok=True)
+        np.savez(os.path.join(path, "postings.npz"), term_ptr=postings.term_ptr, postings_doc=postings.postings_doc,
+                 postings_tf=postings.postings_tf, doc_length=postings.doc_length, idf=postings.idf)
+        with open(os.path.join(path, "documents.json"), 'w') as f:
+            json.dump({'tensor_fields': self.tensor_fields, 'doc_ids': postings.doc_ids,
+                       'vocabulary': postings.vocabulary, 'documents': self.documents}, f)
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+        with open(os.path.join(path, "documents.json")) as f:
+            data = json.load(f)
+        index = cls(data['tensor_fields'])
+        index.documents = data['documents']
+        with np.load(os.path.join(path, "postings.npz")) as arrays:
+            index.postings = Postings(data['doc_ids'], [index.documents[document_id] for document_id in data['doc_ids']],
+                                      data['vocabulary'], arrays['term_ptr'], arrays['postings_doc'],
+                                      arrays['postings_tf'], arrays['doc_length'], arrays['idf'])
+        index.dirty = False
+        return index
+
+class LocalBackend(SearchBackend):
+    # In-process engine for CI and air-gapped hosts; indexes are persisted
+    # under `directory` on refresh() and loaded lazily on first use.
+    def __init__(self, directory=LOCAL_INDEX_DIR):
+        self.directory = directory
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def index_path(self, index_name):
+        return os.path.join(self.directory, index_name)
+
+    def get_index(self, index_name):
+        if index_name not in self.indexes:
+            self.indexes[index_name] = LocalIndex.load(self.index_path(index_name))
+        return self.indexes[index_name]
+
+    def index_exists(self, index_name):
+        return index_name in self.indexes or os.path.exists(os.path.join(self.index_path(index_name), "documents.json"))
+
+    def create_index(self, index_name):
+        with self.lock:
+            self.indexes[index_name] = LocalIndex(self.tensor_fields)
+
+    def delete_index(self, index_name):
+        with self.lock:
+            self.indexes.pop(index_name, None)
+            path = self.index_path(index_name)
+            for filename in ("documents.json", "postings.npz"):
+                if os.path.exists(os.path.join(path, filename)):
+                    os.remove(os.path.join(path, filename))
+
+    def add_documents(self, index_name, documents):
+        with self.lock:
+            index = self.get_index(index_name)
+            for document in documents:
+                document = dict(document)
+                document_id = document.pop('_id', None) or uuid.uuid4().hex
+                index.documents[document_id] = document
+            index.dirty = True
+        return []
+
+    def get_documents(self, index_name, document_ids):
+        with self.lock:
+            index = self.get_index(index_name)
+            return {document_id: dict(index.documents[document_id], _id=document_id)
+                    for document_id in document_ids if document_id in index.documents}
+
+    def delete_documents(self, index_name, document_ids):
+        with self.lock:
+            index = self.get_index(index_name)
+            for document_id in document_ids:
+                index.documents.pop(document_id, None)
+            index.dirty = True
+
+    def search(self, index_name, query, limit, filter_string=None):
+        # Only loading the index and rebuilding stale postings need the lock;
+        # scoring reads a snapshot no writer changes.
+        with self.lock:
+            postings = self.get_index(index_name).current()
+        return postings.search(query, limit, filter_string)
+
+    def refresh(self, index_name):
+        with self.lock:
+            self.get_index(index_name).save(self.index_path(index_name))
+
+def create_backend(name):
+    if name == "marqo":
+        return MarqoBackend()
+    if name == "local":
+        return LocalBackend()
+    raise ValueError(f"Unknown search backend '{name}'")
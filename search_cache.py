@@ -0,0 +1,83 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_TTL = 24 * 60 * 60
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+def cache_key(query, intent, limit, index_version, backend=None, shard_by=None, reranker=None, filter_string=None):
+    # Everything that changes which hits a search returns: the index version,
+    # the backend and shard layout answering it, the re-ranker state and the
+    # filter the lookup tables push into it.
+    return json.dumps([normalize_query(query), intent, limit, index_version, backend, shard_by, reranker, filter_string])
+
+# LRU cache of search hits with a TTL. Keys carry the index version stamp, so
+# re-indexing invalidates every earlier entry without touching the cache.
+# With a path, entries are also written to SQLite and survive restarts.
+class SearchCache:
+    def __init__(self, max_entries=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS search_cache (key TEXT PRIMARY KEY, hits TEXT, created REAL)")
+            self.db.execute("DELETE FROM search_cache WHERE created < ?", (time.time() - ttl,))
+            self.db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.db is not None:
+                row = self.db.execute("SELECT hits, created FROM search_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self.entries[key] = entry
+            if entry is None or now - entry[1] > self.ttl:
+                if entry is not None:
+                    self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, hits):
+        now = time.time()
+        with self.lock:
+            self.entries[key] = (hits, now)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO search_cache (key, hits, created) VALUES (?, ?, ?)",
+                                (key, json.dumps(hits), now))
+                self.db.execute("DELETE FROM search_cache WHERE key NOT IN "
+                                "(SELECT key FROM search_cache ORDER BY created DESC LIMIT ?)", (self.max_entries,))
+                self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM search_cache")
+                self.db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,214 @@
+import sys
+import json
+import asyncio
+import argparse
+from engine import CopilotEngine, SHARD_BY
+import metrics
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+MAX_CONCURRENCY = 4
+MAX_PENDING = 32
+MAX_BODY_BYTES = 1024 * 1024
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class ServiceBusy(Exception):
+    pass
+
+# Runs queries against one warm engine. At most max_concurrency queries are
+# planned at once; up to max_pending more may wait, and anything beyond that
+# is rejected straight away so callers can back off.
+class QueryService:
+    def __init__(self, engine, max_concurrency=MAX_CONCURRENCY, max_pending=MAX_PENDING, use_llm=True):
+        self.engine = engine
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.use_llm = use_llm
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def answer(self, request):
+        if self.pending >= self.max_concurrency + self.max_pending:
+            self.rejected += 1
+            raise ServiceBusy(f"{self.pending} queries in progress")
+        self.pending += 1
+        try:
+            async with self.semaphore:
+                result = await self.engine.aplan(request['question'],
+                                                 use_llm=request.get('llm', self.use_llm),
+                                                 cache_mode=request.get('cache_mode', 'use'))
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        return dict(self.engine.stats(), pending=self.pending, completed=self.completed,
+                    failed=self.failed, rejected=self.rejected, max_concurrency=self.max_concurrency)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            status, payload = await self.handle_request(reader)
+        except Exception as e:
+            status, payload = 500, {'error': str(e)}
+        if isinstance(payload, str):
+            body = payload.encode('utf-8')
+            content_type = "text/plain; version=0.0.4"
+        else:
+            body = json.dumps(payload).encode('utf-8')
+            content_type = "application/json"
+        headers = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+                   f"Content-Type: {content_type}",
+                   f"Content-Length: {len(body)}",
+                   "Connection: close"]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def handle_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) < 2:
+            return 400, {'error': 'malformed request line'}
+        method, path = request_line[0], request_line[1]
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            return 400, {'error': 'invalid Content-Length'}
+        if length < 0:
+            return 400, {'error': 'invalid Content-Length'}
+        if length > MAX_BODY_BYTES:
+            return 413, {'error': 'request body too large'}
+        body = await reader.readexactly(length) if length else b''
+
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/stats':
+            return 200, self.stats()
+        if path == '/metrics':
+            return 200, metrics.metrics.export_prometheus()
+        if path == '/metrics.json':
+            return 200, metrics.metrics.export_json()
+        if path != '/query':
+            return 404, {'error': f"unknown path {path}"}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError as e:
+            return 400, {'error': f"invalid JSON: {e}"}
+        if not isinstance(request, dict) or not request.get('question'):
+            return 400, {'error': "expected a JSON object with a 'question'"}
+        try:
+            return 200, await self.answer(request)
+        except ServiceBusy as e:
+            return 503, {'error': f"service busy: {e}"}
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving queries on http://{host}:{port} (POST /query, GET /stats, GET /metrics, GET /health); "
+              f"{self.max_concurrency} concurrent, {self.max_pending} pending.")
+        async with server:
+            await server.serve_forever()
+
+    async def run_batch(self, input_path, output_path):
+        # Every question is submitted at once and the semaphore bounds how
+        # many run; results are written in input order. A line that is not a
+        # question gets an error result of its own.
+        with open(input_path) as f:
+            requests = [parse_batch_line(line, number) for number, line in enumerate(f, start=1) if line.strip()]
+        self.max_pending = len(requests)
+
+        async def run(item):
+            request, error = item
+            if error is not None:
+                return error
+            try:
+                result = await self.answer(request)
+            except Exception as e:
+                result = {'question': request.get('question'), 'error': str(e)}
+            if 'id' in request:
+                result['id'] = request['id']
+            return result
+
+        results = await asyncio.gather(*(run(request) for request in requests))
+        with open(output_path, 'w') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+        print(f"Wrote {len(results)} results to {output_path} ({self.failed} failed).")
+
+def parse_batch_line(line, number):
+    # Returns (request, None), or (None, error result) for a bad line.
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return None, {'line': number, 'error': f"invalid JSON: {e}"}
+    if isinstance(request, str):
+        request = {'question': request}
+    if not isinstance(request, dict) or not isinstance(request.get('question'), str) or not request['question']:
+        return None, {'line': number, 'error': "expected a question string or a JSON object with a 'question'"}
+    return request, None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless API catalog copilot service.")
+    parser.add_argument('--directory', default=None, help="directory containing the OpenAPI specs (default: cwd)")
+    parser.add_argument('--index-mode', default='sync', choices=['sync', 'recreate', 'skip'])
+    parser.add_argument('--shard-by', default=SHARD_BY, choices=['none', 'spec', 'tag'],
+                        help="split the index into one shard per spec file or per tag (also SHARD_BY)")
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY)
+    parser.add_argument('--no-llm', action='store_true', help="return the selected APIs and prompt report only")
+    parser.add_argument('--metrics', action='store_true', help="collect per-stage timings and counters (also COPILOT_METRICS=1)")
+    parser.add_argument('--metrics-output', default=None, help="write the metrics to this file on exit (.prom for Prometheus text, otherwise JSON)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve')
+    serve_parser.add_argument('--host', default=SERVICE_HOST)
+    serve_parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    serve_parser.add_argument('--max-pending', type=int, default=MAX_PENDING)
+    batch_parser = subparsers.add_parser('batch')
+    batch_parser.add_argument('input', help="JSONL file of {\"question\": ...} objects")
+    batch_parser.add_argument('output', help="JSONL file to write results to")
+    args = parser.parse_args(argv)
+    if args.metrics or args.metrics_output:
+        metrics.enable()
+
+    engine = CopilotEngine(args.directory, shard_by=args.shard_by)
+    engine.load()
+    engine.prepare_index(args.index_mode)
+
+    async def run():
+        if args.command == 'serve':
+            service = QueryService(engine, args.concurrency, args.max_pending, use_llm=not args.no_llm)
+            await service.serve(args.host, args.port)
+        else:
+            service = QueryService(engine, args.concurrency, use_llm=not args.no_llm)
+            await service.run_batch(args.input, args.output)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.metrics_output:
+            metrics.metrics.write(args.metrics_output)
+            print(f"Wrote metrics to {args.metrics_output}.")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import os
+import re
+import json
+import math
+import hashlib
+from itertools import groupby
+from search_backend import tokenize
+
+SHARD_MODES = ("none", "spec", "tag")
+SHARDS_VERSION = 1
+UNTAGGED = "untagged"
+# Per-shard summaries keep the most frequent terms only.
+SUMMARY_TERMS = 2000
+# Shards scoring below this fraction of the best shard are not queried.
+ROUTE_MIN_RATIO = 0.3
+MAX_ROUTED_SHARDS = 4
+SUMMARY_FIELDS = ("summary", "description", "operationId", "tags", "path")
+
+NON_NAME = re.compile(r"[^a-z0-9]+")
+
+def shard_key(filename, document, shard_by):
+    if shard_by == "tag":
+        tags = [tag.strip() for tag in document.get('tags', '').split(',') if tag.strip()]
+        return tags[0] if tags else UNTAGGED
+    return os.path.splitext(filename)[0]
+
+def shard_index_name(index_name, key):
+    # Marqo index names are limited to letters, digits, '-' and '_'; the hash
+    # keeps keys that slug to the same name apart.
+    slug = NON_NAME.sub('-', key.lower()).strip('-')[:40] or "shard"
+    return f"{index_name}--{slug}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:6]}"
+
+def group_documents(items, shard_by):
+    # Groups (filename, document) pairs by shard. Spec shards arrive one file
+    # at a time, so only one spec is held; tag shards are gathered over the
+    # whole catalog first.
+    if shard_by == "spec":
+        for key, group in groupby(items, key=lambda item: shard_key(item[0], item[1], shard_by)):
+            yield key, [document for _, document in group]
+        return
+    groups = {}
+    for filename, document in items:
+        groups.setdefault(shard_key(filename, document, shard_by), []).append(document)
+    yield from groups.items()
+
+def shard_digest(documents):
+    content = '\n'.join(sorted(f"{document['_id']}:{document['fingerprint']}" for document in documents))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def summarize(documents, max_terms=SUMMARY_TERMS):
+    # Document frequency of each term over the fields routing looks at.
+    frequencies = {}
+    for document in documents:
+        for token in set(tokenize(' '.join(str(document.get(field, '')) for field in SUMMARY_FIELDS))):
+            frequencies[token] = frequencies.get(token, 0) + 1
+    top = sorted(frequencies.items(), key=lambda item: (-item[1], item[0]))[:max_terms]
+    return dict(top)
+
+# Routing table for a catalog split into one search index per spec file (or
+# per tag). Each shard keeps a term summary, the digest of its documents'
+# fingerprints and the ids it holds. A query is sent to the shards whose
+# summaries match it best, scored like BM25 over shards instead of documents;
+# a shard whose digest is unchanged is left alone on re-ingest.
+class ShardRouter:
+    def __init__(self, shard_by="spec"):
+        self.shard_by = shard_by
+        self.shards = {}
+        self.document_shards = {}
+
+    def __len__(self):
+        return len(self.shards)
+
+    def names(self):
+        return list(self.shards)
+
+    def digest(self, name):
+        shard = self.shards.get(name)
+        return shard['digest'] if shard else None
+
+    def update(self, name, key, documents, digest):
+        self.shards[name] = {'key': key, 'documents': len(documents), 'digest': digest, 'terms': summarize(documents),
+                             'ids': [document['_id'] for document in documents]}
+        for document in documents:
+            self.document_shards[document['_id']] = name
+
+    def remove(self, name):
+        shard = self.shards.pop(name, None)
+        for document_id in (shard or {}).get('ids', []):
+            if self.document_shards.get(document_id) == name:
+                del self.document_shards[document_id]
+
+    def route(self, query, max_shards=MAX_ROUTED_SHARDS, min_ratio=ROUTE_MIN_RATIO):
+        tokens = set(tokenize(query))
+        scores = {}
+        for token in tokens:
+            holders = [name for name, shard in self.shards.items() if token in shard['terms']]
+            if not holders or len(holders) == len(self.shards):
+                continue
+            idf = math.log(1.0 + len(self.shards) / len(holders))
+            for name in holders:
+                shard = self.shards[name]
+                scores[name] = scores.get(name, 0.0) + idf * shard['terms'][token] / (shard['terms'][token] + 1.0)
+        if not scores:
+            # Nothing in the query tells the shards apart.
+            return self.names()
+        best = max(scores.values())
+        ranked = sorted((name for name in scores if scores[name] >= best * min_ratio), key=lambda name: -scores[name])
+        return ranked[:max_shards]
+
+    def shards_for(self, document_ids):
+        grouped = {}
+        for document_id in document_ids:
+            name = self.document_shards.get(document_id)
+            if name is not None:
+                grouped.setdefault(name, []).append(document_id)
+        return grouped
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': SHARDS_VERSION, 'shard_by': self.shard_by, 'shards': self.shards}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, shard_by="spec"):
+        router = cls(shard_by)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return router
+        if data.get('version') != SHARDS_VERSION or data.get('shard_by') != shard_by:
+            return router
+        router.shards = data['shards']
+        for name, shard in router.shards.items():
+            for document_id in shard['ids']:
+                router.document_shards[document_id] = name
+        return router
+
+def merge_by_score(hit_lists, limit):
+    hits = [hit for hits in hit_lists for hit in hits]
+    hits.sort(key=lambda hit: -hit.get('_score', 0.0))
+    return hits[:limit]
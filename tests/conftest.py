@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TRAIN_TRAVEL_SPEC = os.path.join(ROOT, "train-travel-api-openapi-source.json")
+
+@pytest.fixture
+def spec_dir(tmp_path):
+    # A catalog directory holding the train travel spec, parsed in-process.
+    directory = tmp_path / "specs"
+    directory.mkdir()
+    with open(TRAIN_TRAVEL_SPEC) as src:
+        (directory / "train-travel.json").write_text(src.read())
+    return directory
+
+@pytest.fixture
+def train_travel_records(spec_dir, tmp_path):
+    from api_loader import iter_openapi_specifications
+    records = []
+    for _, _, endpoints in iter_openapi_specifications(str(spec_dir), cache_dir=str(tmp_path / "cache"), max_workers=1):
+        records.extend(endpoints)
+    return records
+
+@pytest.fixture
+def engine(spec_dir, tmp_path, monkeypatch):
+    # A local-backend engine indexed from spec_dir; index metadata and the
+    # local index are written under tmp_path.
+    from engine import CopilotEngine
+    monkeypatch.chdir(tmp_path)
+    engine = CopilotEngine(str(spec_dir), backend_name="local", shard_by="none")
+    engine.load()
+    engine.prepare_index()
+    return engine
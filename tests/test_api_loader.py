@@ -0,0 +1,66 @@
+from api_loader import iter_openapi_specifications
+
+def load(directory, cache_dir):
+    return [(filename, list(endpoints)) for filename, _, endpoints in
+            iter_openapi_specifications(str(directory), cache_dir=str(cache_dir), max_workers=1)]
+
+def test_invalid_spec_is_skipped(spec_dir, tmp_path, capsys):
+    (spec_dir / "broken.yaml").write_text("openapi: 3.0.0\npaths: [unclosed\n")
+    loaded = load(spec_dir, tmp_path / "cache")
+    assert [filename for filename, _ in loaded] == ["train-travel.json"]
+    assert loaded[0][1]
+    assert "Skipping broken.yaml" in capsys.readouterr().out
+
+def test_cached_load_matches_parse(spec_dir, tmp_path):
+    first = load(spec_dir, tmp_path / "cache")
+    second = load(spec_dir, tmp_path / "cache")
+    assert [record.id for record in first[0][1]] == [record.id for record in second[0][1]]
+
+def test_endpoint_ids_differ_between_files_sharing_a_title(spec_dir, tmp_path):
+    with open(spec_dir / "train-travel.json") as f:
+        (spec_dir / "train-travel-copy.json").write_text(f.read())
+    loaded = dict(load(spec_dir, tmp_path / "cache"))
+    first = [record.id for record in loaded["train-travel.json"]]
+    second = [record.id for record in loaded["train-travel-copy.json"]]
+    assert len(first) == len(second)
+    assert not set(first) & set(second)
+
+def schema_spec(**schemas):
+    return {'openapi': '3.0.0', 'paths': {}, 'components': {'schemas': schemas}}
+
+def test_self_referencing_schema_is_cut_and_cached():
+    from api_loader import SchemaCache
+    spec = schema_spec(Node={'properties': {
+        'name': {'description': 'Node name'},
+        'children': {'type': 'array', 'items': {'$ref': '#/components/schemas/Node'}}}})
+    cache = SchemaCache(spec)
+    assert cache.flatten('#/components/schemas/Node') == {'name': 'Node name'}
+    assert cache.stats() == {'refs': 1, 'hits': 0, 'misses': 1, 'cycles': 1}
+    # The cycle was through the schema itself, so the result is complete and cached.
+    assert cache.flatten('#/components/schemas/Node') == {'name': 'Node name'}
+    assert cache.stats() == {'refs': 1, 'hits': 1, 'misses': 1, 'cycles': 1}
+
+def test_mutual_all_of_cycle_does_not_cache_partial_results():
+    from api_loader import SchemaCache
+    spec = schema_spec(
+        A={'allOf': [{'$ref': '#/components/schemas/B'}, {'properties': {'a': {'description': 'from A'}}}]},
+        B={'allOf': [{'$ref': '#/components/schemas/A'}, {'properties': {'b': {'description': 'from B'}}}]})
+    cache = SchemaCache(spec)
+    assert cache.flatten('#/components/schemas/A') == {'a': 'from A', 'b': 'from B'}
+    assert cache.stats() == {'refs': 1, 'hits': 0, 'misses': 2, 'cycles': 1}
+    # B was cut short by the cycle through A, so it was not cached without
+    # A's fields; flattening it on its own finds them through the cached A.
+    assert '#/components/schemas/B' not in cache.flattened
+    assert cache.flatten('#/components/schemas/B') == {'a': 'from A', 'b': 'from B'}
+    assert cache.stats() == {'refs': 2, 'hits': 1, 'misses': 3, 'cycles': 1}
+    assert cache.flatten('#/components/schemas/B') == {'a': 'from A', 'b': 'from B'}
+    assert cache.stats()['hits'] == 2
+
+def test_shared_refs_are_flattened_once():
+    from api_loader import SchemaCache, extract_properties
+    spec = schema_spec(Money={'properties': {'amount': {'description': 'Amount'}}})
+    cache = SchemaCache(spec)
+    for _ in range(3):
+        schema = {'properties': {'price': {'$ref': '#/components/schemas/Money'}}}
+        assert extract_properties(schema, spec, cache) == {'amount': 'Amount'}
+    assert cache.stats() == {'refs': 1, 'hits': 2, 'misses': 1, 'cycles': 0}
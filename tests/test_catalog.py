@@ -0,0 +1,72 @@
+import os
+from catalog import CatalogWriter, EndpointCatalog
+from engine import CopilotEngine, catalog_path
+
+DOCUMENTS = [
+    {'_id': 'a', 'path': '/trips', 'method': 'get', 'responses': '{"200": "ok"}'},
+    {'_id': 'b', 'path': '/bookings', 'method': 'post', 'summary': 'Créer une réservation'},
+]
+
+def write_catalog(path, documents=DOCUMENTS):
+    writer = CatalogWriter(str(path))
+    for document in documents:
+        writer.add(document)
+    return writer.close()
+
+def test_catalog_round_trip(tmp_path):
+    path = tmp_path / "index.catalog"
+    stats = write_catalog(path)
+    assert stats['endpoints'] == 2 and stats['bytes'] == os.path.getsize(path)
+    catalog = EndpointCatalog(str(path))
+    assert len(catalog) == 2
+    assert catalog.get('a') == {'path': '/trips', 'method': 'get', 'responses': '{"200": "ok"}'}
+    assert catalog.get('b')['summary'] == 'Créer une réservation'
+    assert catalog.get('missing') is None
+    assert catalog.get_many(['b', 'missing']) == {'b': dict(DOCUMENTS[1])}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith((".data", ".tmp"))]
+    catalog.close()
+    assert catalog.get('a') is None
+
+def test_abort_removes_temporary_data(tmp_path):
+    writer = CatalogWriter(str(tmp_path / "index.catalog"))
+    writer.add(DOCUMENTS[0])
+    writer.abort()
+    assert os.listdir(tmp_path) == []
+
+def test_missing_or_foreign_file_reads_as_empty(tmp_path):
+    assert len(EndpointCatalog(str(tmp_path / "absent.catalog"))) == 0
+    foreign = tmp_path / "foreign.catalog"
+    foreign.write_bytes(b"NOTACAT0" + bytes(16))
+    catalog = EndpointCatalog(str(foreign))
+    assert len(catalog) == 0 and catalog.get('a') is None
+
+def test_hydrate_drops_hits_the_catalog_lacks(engine, train_travel_records):
+    endpoint_id = train_travel_records[0].id
+    hits = engine.hydrate([{'_id': endpoint_id, '_score': 1.5}, {'_id': 'stale', '_score': 1.0}])
+    assert len(hits) == 1
+    assert hits[0]['_id'] == endpoint_id and hits[0]['_score'] == 1.5
+    assert 'path' in hits[0] and 'responses' in hits[0] and 'operationId' in hits[0]
+
+def test_hydrate_refetches_complete_backend_documents(engine, monkeypatch):
+    document = {'_id': 'legacy', 'path': '/legacy', 'method': 'get', 'responses': '{}', 'operationId': 'legacy'}
+    monkeypatch.setattr(engine.backend, 'get_documents', lambda index_name, ids: {'legacy': document})
+    assert engine.hydrate([{'_id': 'legacy', '_score': 2.0}]) == [dict(document, _score=2.0)]
+    # Slim index documents are not enough to answer with.
+    slim = {'_id': 'legacy', 'fingerprint': 'f', 'method': 'get'}
+    monkeypatch.setattr(engine.backend, 'get_documents', lambda index_name, ids: {'legacy': slim})
+    assert engine.hydrate([{'_id': 'legacy', '_score': 2.0}]) == []
+
+def test_shard_modes_keep_separate_catalogs(engine, spec_dir):
+    sharded = CopilotEngine(str(spec_dir), backend_name="local", shard_by="spec")
+    sharded.load()
+    sharded.prepare_index()
+    assert catalog_path(engine.index_name) != catalog_path(engine.index_name, 'spec')
+    assert os.path.exists(catalog_path(engine.index_name))
+    assert os.path.exists(catalog_path(engine.index_name, 'spec'))
+    # Re-opening the unsharded engine still finds its own documents.
+    restarted = CopilotEngine(str(spec_dir), backend_name="local", shard_by="none")
+    restarted.load()
+    restarted.prepare_index('skip')
+    assert len(restarted.catalog) == len(engine.catalog)
+    sub_queries, apis = restarted.search("find trips between two stations")
+    assert apis and all('path' in api for api in apis)
@@ -0,0 +1,53 @@
+import pytest
+from dataflow import DataflowGraph, expand_chain
+
+@pytest.fixture
+def graph(train_travel_records):
+    graph = DataflowGraph()
+    for record in train_travel_records:
+        graph.add(record)
+    graph.build()
+    return graph
+
+@pytest.fixture
+def ids(train_travel_records):
+    return {record.operation_id: record.id for record in train_travel_records}
+
+def operations(pairs, ids):
+    names = {endpoint_id: name for name, endpoint_id in ids.items()}
+    return {(names[node], key) for node, key in pairs}
+
+def test_edges_link_producers_to_consumers(graph, ids):
+    assert operations(graph.upstream(ids['create-booking-payment']), ids) == {
+        ('get-bookings', 'bookingId'), ('create-booking', 'bookingId'), ('get-booking', 'bookingId')}
+    assert ('get-trips', 'trip_id') in operations(graph.upstream(ids['create-booking']), ids)
+    assert graph.upstream(ids['get-stations']) == []
+
+def test_csr_directions_agree(graph):
+    assert graph.out_ptr[-1] == graph.in_ptr[-1] == graph.edge_count
+    forward = {(node, key, consumer) for node in graph.nodes for consumer, key in graph.downstream(node)}
+    backward = {(producer, key, node) for node in graph.nodes for producer, key in graph.upstream(node)}
+    assert forward == backward and len(forward) == graph.edge_count
+
+def test_walk_upstream_respects_depth(graph, ids):
+    walked = list(graph.walk_upstream(ids['create-booking-payment'], depth=2))
+    assert {distance for _, _, _, distance in walked} == {1, 2}
+    assert any(producer == ids['get-trips'] and distance == 2 for producer, _, _, distance in walked)
+    assert all(distance == 1 for _, _, _, distance in graph.walk_upstream(ids['create-booking-payment'], depth=1))
+
+def test_save_and_load(graph, ids, tmp_path):
+    graph.save(str(tmp_path / "dataflow.json"))
+    loaded = DataflowGraph.load(str(tmp_path / "dataflow.json"))
+    assert loaded.stats() == graph.stats()
+    assert loaded.upstream(ids['create-booking']) == graph.upstream(ids['create-booking'])
+    assert loaded.label(ids['get-trips']) == "GET /trips"
+    assert DataflowGraph.load(str(tmp_path / "missing.json")).edge_count == 0
+
+def test_expand_chain_adds_missing_producers(graph, ids, train_travel_records):
+    documents = {record.id: record.index_document() for record in train_travel_records}
+    chain = [{'sub_query': "pay for a booking",
+              'relevant_apis': [dict(documents[ids['create-booking-payment']], _score=1.0)]}]
+    expand_chain(chain, graph, lambda wanted: {i: documents[i] for i in wanted}, limit=5)
+    added = [hit for hit in chain[0]['relevant_apis'] if '_dataflow' in hit]
+    assert added and all(hit['_dataflow']['provides'] for hit in added)
+    assert {hit['_id'] for hit in added} <= {ids['get-bookings'], ids['create-booking'], ids['get-booking'], ids['get-trips']}
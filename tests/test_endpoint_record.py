@@ -0,0 +1,53 @@
+import pytest
+from endpoint_record import EndpointRecord, render_prompt_block, size_report
+
+RECORD = EndpointRecord(
+    "id-1", "/bookings/{bookingId}", "get", summary="Get a booking", description="Returns one booking ✓",
+    operation_id="get-booking", tags=["Bookings", "Payments"],
+    responses=[("200", (("id", "Booking id"), ("trip_id", ""))), ("404", ()), ("401", ())],
+    request_body=(("x" * 300, "long field name"),))
+
+def test_bytes_round_trip():
+    data = RECORD.to_bytes()
+    copy = EndpointRecord.from_bytes(data)
+    for slot in EndpointRecord.__slots__:
+        assert getattr(copy, slot) == getattr(RECORD, slot)
+    assert copy.to_bytes() == data
+
+def test_round_trip_shares_field_tuples():
+    shared = {}
+    first = EndpointRecord.from_bytes(RECORD.to_bytes(), shared)
+    second = EndpointRecord.from_bytes(RECORD.to_bytes(), shared)
+    assert first.responses[0][1] is second.responses[0][1]
+    assert first.fingerprint == RECORD.fingerprint
+
+def test_unknown_version_is_rejected():
+    with pytest.raises(ValueError):
+        EndpointRecord.from_bytes(b"\x7f" + RECORD.to_bytes()[1:])
+
+def test_prompt_block_indents_multi_line_responses():
+    block = render_prompt_block(RECORD.index_document())
+    lines = block.splitlines()
+    start = next(i for i, line in enumerate(lines) if line.startswith("    Responses: "))
+    assert lines[start] == "    Responses: 200: id: Booking id; trip_id"
+    assert lines[start + 1] == " " * 15 + "404, 401"
+    assert lines[start + 2].startswith("    Request Body: ")
+
+def test_size_report_counts_every_record():
+    report = size_report([RECORD, EndpointRecord.from_bytes(RECORD.to_bytes())])
+    assert report['endpoints'] == 2
+    assert report['binary_bytes'] == 2 * len(RECORD.to_bytes())
+    assert report['memory_bytes'] > 0 and report['document_bytes'] > report['binary_bytes'] // 2
+
+def test_size_report_compares_with_legacy_documents():
+    import json
+    from conftest import TRAIN_TRAVEL_SPEC
+    from api_loader import extract_endpoints
+    from benchmark import legacy_documents
+    with open(TRAIN_TRAVEL_SPEC) as f:
+        spec = json.load(f)
+    legacy = legacy_documents(spec)
+    report = size_report(extract_endpoints(spec), legacy)
+    assert len(legacy) == report['endpoints'] == 7
+    assert report['legacy_document_bytes'] == sum(len(json.dumps(document)) for document in legacy)
+    assert report['legacy_memory_bytes'] > 0
@@ -0,0 +1,160 @@
+import os
+import pytest
+from engine import CopilotEngine, catalog_path, schema_table_path, version_path
+
+def test_prepare_index_builds_everything(engine, train_travel_records):
+    assert engine.stats()['endpoints'] == len(train_travel_records)
+    for path in (catalog_path(engine.index_name, engine.shard_by), schema_table_path(engine.index_name), version_path(engine.index_name)):
+        assert os.path.exists(path)
+    sub_queries, apis = engine.search("find trips between two stations")
+    assert sub_queries and any(api['operationId'] == 'get-trips' for api in apis)
+
+def test_skip_mode_reports_indexed_endpoints(engine, spec_dir, train_travel_records):
+    restarted = CopilotEngine(str(spec_dir), backend_name="local", shard_by="none")
+    restarted.load()
+    assert restarted.prepare_index('skip') is None
+    assert restarted.stats()['endpoints'] == len(train_travel_records)
+
+def test_failed_ingest_saves_nothing(spec_dir, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    engine = CopilotEngine(str(spec_dir), backend_name="local", shard_by="none")
+    engine.load()
+
+    def refresh(index_name):
+        raise RuntimeError("backend went away")
+    monkeypatch.setattr(engine.backend, 'refresh', refresh)
+    with pytest.raises(RuntimeError, match="backend went away"):
+        engine.prepare_index()
+    assert not os.path.exists(version_path(engine.index_name))
+    assert not os.path.exists(schema_table_path(engine.index_name))
+    assert not os.path.exists(catalog_path(engine.index_name, engine.shard_by))
+    assert not [name for name in os.listdir(".spec_cache") if name.endswith((".data", ".tmp"))]
+
+def test_prefetch_passes_items_and_errors_through():
+    from engine import prefetch
+    assert list(prefetch(range(100), maxsize=4)) == list(range(100))
+
+    def failing():
+        yield 1
+        raise ValueError("bad spec")
+    with pytest.raises(ValueError, match="bad spec"):
+        list(prefetch(failing()))
+
+def test_prefetch_stops_producer_when_consumer_fails():
+    import threading
+    from engine import prefetch
+    closed = threading.Event()
+
+    def endless():
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            closed.set()
+
+    before = threading.active_count()
+    items = prefetch(endless(), maxsize=2)
+    assert next(items) == 0
+    with pytest.raises(RuntimeError):
+        items.throw(RuntimeError("index failed"))
+    assert closed.is_set()
+    assert threading.active_count() == before
+
+def test_fully_cached_batch_is_counted(engine, monkeypatch):
+    import metrics
+    from metrics import metric_key
+    registry = metrics.Metrics(enabled=True)
+    monkeypatch.setattr(metrics, 'metrics', registry)
+    sub_queries = ["find trips", "list stations"]
+    first = engine.search_relevant_apis_many(sub_queries, engine.index_name, 5)
+    assert engine.search_relevant_apis_many(sub_queries, engine.index_name, 5) == first
+    assert registry.counters[metric_key('search_cache', {'result': 'hit'})] == 2
+    assert registry.counters[metric_key('search_cache', {'result': 'miss'})] == 2
+    assert engine.search_cache.stats()['hits'] == 2
+
+def fake_documents(n):
+    return [{'_id': f"doc-{i}", 'fingerprint': f"fp-{i}", 'summary': f"endpoint {i} " + "x" * 40} for i in range(n)]
+
+@pytest.fixture
+def flaky_backend(engine, monkeypatch):
+    # Records every add_documents call; the first `failures` calls raise.
+    import engine as engine_module
+    state = {'batches': [], 'failures': 0, 'delays': []}
+    monkeypatch.setattr(engine_module.time, 'sleep', state['delays'].append)
+
+    def add_documents(index_name, documents):
+        if state['failures']:
+            state['failures'] -= 1
+            raise ConnectionError("backend unavailable")
+        state['batches'].append(len(documents))
+        return []
+    monkeypatch.setattr(engine.backend, 'add_documents', add_documents)
+    return state
+
+def test_failed_batches_are_retried_with_backoff(engine, flaky_backend):
+    import engine as engine_module
+    flaky_backend['failures'] = 2
+    report = engine.add_documents_in_batches(engine.index_name, fake_documents(3), max_in_flight=1)
+    assert report['indexed'] == 3 and report['failed'] == 0 and report['errors'] == []
+    assert flaky_backend['delays'] == [engine_module.INGEST_BACKOFF, 2 * engine_module.INGEST_BACKOFF]
+
+    flaky_backend['failures'] = engine_module.INGEST_RETRIES + 1
+    report = engine.add_documents_in_batches(engine.index_name, fake_documents(3), max_in_flight=1)
+    assert report['indexed'] == 0 and report['failed'] == 3
+    assert report['errors'] == [{'batch': 1, 'error': "backend unavailable", 'documents': ["doc-0", "doc-1", "doc-2"]}]
+
+def test_batches_are_capped_by_bytes(engine, flaky_backend, monkeypatch):
+    import json
+    import engine as engine_module
+    documents = fake_documents(20)
+    size = len(json.dumps(documents[0]))
+    monkeypatch.setattr(engine_module, 'MAX_BATCH_BYTES', 3 * size + size // 2)
+    report = engine.add_documents_in_batches(engine.index_name, documents, max_in_flight=1)
+    assert report['indexed'] == 20
+    assert max(flaky_backend['batches']) == 3 and sum(flaky_backend['batches']) == 20
+
+def test_batch_size_follows_latency(engine, flaky_backend, monkeypatch):
+    import engine as engine_module
+    monkeypatch.setattr(engine_module, 'BATCH_SIZE', 4)
+    monkeypatch.setattr(engine_module, 'MIN_BATCH_SIZE', 2)
+    monkeypatch.setattr(engine_module, 'MAX_BATCH_SIZE', 16)
+    # Fast batches grow towards the maximum...
+    monkeypatch.setattr(engine_module, 'INGEST_TARGET_LATENCY', 60.0)
+    engine.add_documents_in_batches(engine.index_name, fake_documents(60), max_in_flight=1)
+    assert flaky_backend['batches'] == [4, 6, 9, 13, 16, 12]
+    # ...and slow ones shrink towards the minimum.
+    flaky_backend['batches'].clear()
+    monkeypatch.setattr(engine_module, 'INGEST_TARGET_LATENCY', 0.0)
+    engine.add_documents_in_batches(engine.index_name, fake_documents(10), max_in_flight=1)
+    assert flaky_backend['batches'] == [4, 2, 2, 2]
+
+def test_sync_reports_ingest_failures(engine, flaky_backend):
+    import engine as engine_module
+    flaky_backend['failures'] = engine_module.INGEST_RETRIES + 1
+    report = engine.sync_index(engine.index_name, fake_documents(2))
+    assert report['added'] == 2 and report['indexed'] == 0 and report['failed'] == 2
+    assert report['errors'][0]['documents'] == ["doc-0", "doc-1"]
+    # The documents are still missing from the index, so the next sync sends them again.
+    report = engine.sync_index(engine.index_name, fake_documents(2))
+    assert report['added'] == 2 and report['indexed'] == 2 and report['failed'] == 0
+
+def test_running_engine_picks_up_another_engines_sync(engine, spec_dir):
+    import json
+    # A second worker on the same index (a shared backend) syncs a new operation.
+    spec = json.loads((spec_dir / "train-travel.json").read_text())
+    spec['paths']['/bookings/{bookingId}/refund'] = {'post': {
+        'operationId': 'create-refund', 'summary': 'Create a refund', 'tags': ['Refunds'],
+        'description': 'Refund the payment made for a cancelled booking.',
+        'responses': {'201': {'description': 'The refund was created.'}}}}
+    (spec_dir / "train-travel.json").write_text(json.dumps(spec))
+    other = CopilotEngine(str(spec_dir), backend_name="local", shard_by="none")
+    other.load()
+    other.backend = engine.backend
+    other.prepare_index('sync')
+
+    _, apis = engine.search("refund the payment for a cancelled booking")
+    assert any(api['operationId'] == 'create-refund' and api['path'] for api in apis)
+    assert len(engine.catalog) == len(other.catalog) == len(engine.reranker)
+    assert engine.lookup.exact("call create-refund", 'post')[1]
@@ -0,0 +1,43 @@
+import os
+import json
+import time
+from llm_cache import ResponseCache, response_key
+
+def test_key_depends_on_server_model_options_and_prompt():
+    key = response_key("llama3", {'temperature': 0}, "plan", "http://a:11434")
+    assert key == response_key("llama3", {'temperature': 0}, "plan", "http://a:11434")
+    assert key != response_key("llama3", {'temperature': 0}, "plan", "http://b:11434")
+    assert key != response_key("llama3", {'temperature': 1}, "plan", "http://a:11434")
+    assert key != response_key("mistral", {'temperature': 0}, "plan", "http://a:11434")
+
+def test_round_trip_and_expiry(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age=60)
+    cache.put("k", ["a", "b"], "llama3")
+    assert cache.get("k") == ["a", "b"]
+    with open(cache.entry_path("k"), 'w') as f:
+        json.dump({'created': time.time() - 120, 'chunks': ["a"]}, f)
+    assert cache.get("k") is None
+    assert not os.path.exists(cache.entry_path("k"))
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+def test_entry_without_created_is_a_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    for content in ({'chunks': ["a"]}, ["a"], {'created': "yesterday", 'chunks': ["a"]}):
+        with open(cache.entry_path("k"), 'w') as f:
+            json.dump(content, f)
+        assert cache.get("k") is None
+    assert cache.stats()['misses'] == 3
+
+def test_eviction_keeps_recently_read_entries(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    for i, key in enumerate(("old", "middle")):
+        cache.put(key, ["x" * 100])
+        past = time.time_ns() - (10 - i) * 10**9
+        os.utime(cache.entry_path(key), ns=(past, past))
+    assert cache.get("old") == ["x" * 100]
+    # Room for two entries; sizes differ by a few bytes of timestamp.
+    cache.max_bytes = 2 * os.path.getsize(cache.entry_path("old")) + 50
+    cache.put("new", ["x" * 100])
+    assert cache.get("old") is not None
+    assert cache.get("new") is not None
+    assert not os.path.exists(cache.entry_path("middle"))
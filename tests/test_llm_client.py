@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import pytest
+from llm_client import OllamaClient, LLMError, format_metrics, new_metrics
+from llm_cache import ResponseCache
+from ollama_stub import start_stub_server, StubHandler, STUB_REPLY
+
+@pytest.fixture
+def stub():
+    server, url = start_stub_server()
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+def start_raw_server(lines):
+    # A stub whose /api/generate answers with the given raw NDJSON lines.
+    server, url = start_stub_server()
+
+    def do_POST(handler):
+        handler.rfile.read(int(handler.headers.get('Content-Length', 0)))
+        handler.send_response(200)
+        handler.end_headers()
+        for line in lines:
+            handler.wfile.write(line + b"\n")
+
+    server.RequestHandlerClass = type('RawHandler', (StubHandler,), {'do_POST': do_POST})
+    return server, url
+
+def test_generate_returns_reply_and_metrics(stub):
+    server, url = stub
+    client = OllamaClient(url=url, model="test-model", options={'temperature': 0})
+    text, metrics = client.generate("plan a trip")
+    assert text == STUB_REPLY
+    assert metrics['tokens'] == len(STUB_REPLY.split(' '))
+    assert metrics['time_to_first_token'] is not None
+    assert metrics['total_latency'] >= metrics['time_to_first_token']
+    assert not metrics['cancelled'] and not metrics['cached']
+    assert server.RequestHandlerClass.requests_seen == [
+        {'model': "test-model", 'prompt': "plan a trip", 'stream': True, 'options': {'temperature': 0}}]
+    assert "total" in format_metrics(metrics)
+
+def test_stream_yields_chunks_in_order(stub):
+    _, url = stub
+    chunks = list(OllamaClient(url=url).stream("plan a trip"))
+    assert len(chunks) == len(STUB_REPLY.split(' '))
+    assert ''.join(chunks) == STUB_REPLY
+
+def test_cancel_event_stops_the_stream(stub):
+    _, url = stub
+    cancel_event = threading.Event()
+    seen = []
+
+    def on_chunk(chunk):
+        seen.append(chunk)
+        if len(seen) == 2:
+            cancel_event.set()
+
+    text, metrics = OllamaClient(url=url).generate("plan a trip", on_chunk=on_chunk, cancel_event=cancel_event)
+    assert len(seen) == 2 and text == ''.join(seen)
+    assert metrics['cancelled']
+    assert "cancelled" in format_metrics(metrics)
+
+def test_async_generate_matches_generate(stub):
+    _, url = stub
+    text, metrics = asyncio.run(OllamaClient(url=url).agenerate("plan a trip"))
+    assert text == STUB_REPLY and metrics['total_latency'] is not None
+
+def test_cached_replay_and_early_stop(stub, tmp_path):
+    server, url = stub
+    client = OllamaClient(url=url, cache=ResponseCache(str(tmp_path / "llm")))
+    text, _ = client.generate("plan a trip")
+    text_again, metrics = client.generate("plan a trip")
+    assert text_again == text and metrics['cached']
+    assert len(server.RequestHandlerClass.requests_seen) == 1
+
+    metrics = new_metrics()
+    stream = client.stream("plan a trip", metrics=metrics)
+    next(stream)
+    stream.close()
+    assert metrics['total_latency'] is not None
+    assert "from cache" in format_metrics(metrics)
+
+    cancel_event = threading.Event()
+    cancel_event.set()
+    text, metrics = client.generate("plan a trip", cancel_event=cancel_event)
+    assert text == '' and metrics['cancelled'] and metrics['total_latency'] is not None
+
+def test_http_error_raises_llm_error(stub):
+    _, url = stub
+    client = OllamaClient(url=f"{url}/missing")
+    with pytest.raises(LLMError):
+        client.generate("plan a trip")
+    assert client.last_metrics['total_latency'] is not None
+
+def test_connection_error_raises_llm_error(stub):
+    server, url = stub
+    server.shutdown()
+    server.server_close()
+    with pytest.raises(LLMError):
+        OllamaClient(url=url, connect_timeout=1.0).generate("plan a trip")
+
+def test_malformed_line_raises_llm_error():
+    server, url = start_raw_server([b'{"response": "ok", "done": false}', b'not json'])
+    try:
+        client = OllamaClient(url=url)
+        with pytest.raises(LLMError, match="malformed"):
+            client.generate("plan a trip")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_error_message_raises_llm_error():
+    server, url = start_raw_server([b'{"error": "model not found"}'])
+    try:
+        with pytest.raises(LLMError, match="model not found"):
+            OllamaClient(url=url).generate("plan a trip")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,84 @@
+import re
+import pytest
+from llm_handler import build_prompt, SHARED_SCHEMAS_HEADER
+from schema_table import SchemaTable, SCHEMA_REF
+
+def test_build_prompt_requires_the_schema_table():
+    with pytest.raises(TypeError):
+        build_prompt([], "find trips")
+
+def test_prompt_defines_every_schema_it_references(engine):
+    _, apis = engine.search("book a trip and pay for the booking")
+    schemas = SchemaTable.load(f".spec_cache/{engine.index_name}.schemas.json")
+    prompt, report = build_prompt(apis, "book a trip and pay for the booking", 100000, schemas=schemas)
+    body, _, shared = prompt.partition(SHARED_SCHEMAS_HEADER)
+    defined = set(re.findall(r"^  (@S[0-9a-f]{10}):", shared, re.M))
+    assert set(SCHEMA_REF.findall(body)) <= defined
+    assert not any(SCHEMA_REF.search(schemas.render(ref)) for ref in defined)
+    assert report['full_detail'] == len({api['_id'] for api in apis})
+
+def test_loaded_table_reports_its_schemas(tmp_path):
+    table = SchemaTable()
+    first = table.intern((("id", "Trip id"),))
+    table.intern((("id", "Trip id"),))
+    table.intern((("name", ""),))
+    table.save(str(tmp_path / "schemas.json"))
+    loaded = SchemaTable.load(str(tmp_path / "schemas.json"))
+    assert loaded.stats()['distinct'] == 2
+    assert loaded.stats()['stored_bytes'] == table.stats()['stored_bytes']
+    assert loaded.intern((("id", "Trip id"),)) == first
+    assert len(loaded.schemas) == 2
+    assert loaded.expand(f"200: {first}") == "200: id: Trip id"
+
+@pytest.fixture
+def ranked_apis(engine):
+    # Every indexed endpoint as a hit, ranked in catalog order.
+    ids = [entry[0] for entry in engine.lookup.entries]
+    documents = engine.fetch_documents(ids)
+    return [dict(documents[endpoint_id], _score=float(len(ids) - i)) for i, endpoint_id in enumerate(ids)]
+
+def test_dataflow_edges_never_crowd_out_apis(engine, ranked_apis):
+    for budget in (300, 400, 500, 800, 1200):
+        _, plain = build_prompt(ranked_apis, "book a trip", budget, schemas=engine.schemas)
+        _, report = build_prompt(ranked_apis, "book a trip", budget, schemas=engine.schemas, dataflow=engine.dataflow)
+        assert report['estimated_tokens'] <= budget
+        assert report['compact'] + report['full_detail'] == plain['compact'] + plain['full_detail']
+        assert report['omitted'] == plain['omitted']
+    # Budget the edges do not need is spent on full detail.
+    assert report['dataflow_edges'] == engine.dataflow.edge_count
+    assert report['full_detail'] > 0
+
+def prompt_apis(prompt):
+    # (operationId, full detail?) for each API block, in prompt order.
+    return [(operation_id, kind == "Summary")
+            for operation_id, kind in re.findall(r"^  - OperationId: (\S+)\n    (Signature|Summary):", prompt, re.M)]
+
+def test_prompt_fits_the_budget_in_rank_order(engine, ranked_apis):
+    order = [api['operationId'] for api in ranked_apis]
+    for budget in (250, 350, 500, 800, 1200, 2000, 100000):
+        prompt, report = build_prompt(ranked_apis, "book a trip", budget, schemas=engine.schemas)
+        assert report['estimated_tokens'] <= budget
+        apis = prompt_apis(prompt)
+        names = [name for name, _ in apis]
+        assert names == [name for name in order if name in names]
+        assert sorted(names + report['omitted']) == sorted(order)
+        # Full detail goes to the best-ranked APIs that made it in.
+        assert [full for _, full in apis] == [True] * report['full_detail'] + [False] * report['compact']
+    assert report['omitted'] == [] and report['compact'] == 0
+
+def test_smaller_budgets_compact_then_omit(engine, ranked_apis):
+    _, roomy = build_prompt(ranked_apis, "book a trip", 100000, schemas=engine.schemas)
+    _, tight = build_prompt(ranked_apis, "book a trip", 500, schemas=engine.schemas)
+    _, tiny = build_prompt(ranked_apis, "book a trip", 250, schemas=engine.schemas)
+    assert roomy['full_detail'] == len(ranked_apis)
+    assert tight['full_detail'] < len(ranked_apis) and not tight['omitted']
+    assert tiny['full_detail'] == 0 and tiny['omitted'] == [api['operationId'] for api in ranked_apis[-len(tiny['omitted']):]]
+
+def test_duplicates_keep_their_best_score(engine, ranked_apis):
+    worst = dict(ranked_apis[-1], _score=100.0)
+    prompt, report = build_prompt(ranked_apis + [worst, dict(ranked_apis[0])], "book a trip", 100000,
+                                  schemas=engine.schemas)
+    assert report['duplicates_removed'] == 2
+    names = [name for name, _ in prompt_apis(prompt)]
+    assert len(names) == len(ranked_apis)
+    assert names[0] == worst['operationId']
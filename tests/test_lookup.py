@@ -0,0 +1,64 @@
+import pytest
+from lookup import EndpointLookup, MAX_FILTER_IDS
+from search_backend import parse_filter
+
+@pytest.fixture
+def lookup(train_travel_records):
+    lookup = EndpointLookup()
+    for record in train_travel_records:
+        lookup.add(record)
+    return lookup
+
+@pytest.fixture
+def ids(train_travel_records):
+    return {record.operation_id: record.id for record in train_travel_records}
+
+def test_exact_operation_id(lookup, ids):
+    assert lookup.exact("how do I call create-booking?") == ('operationId', [ids['create-booking']])
+    assert lookup.exact("Create-Booking") == ('operationId', [ids['create-booking']])
+    # Plain words never short-circuit the search.
+    assert lookup.exact("booking") == (None, [])
+
+def test_exact_path_follows_parameters_and_intent(lookup, ids):
+    kind, found = lookup.exact("what does /bookings/123 return")
+    assert kind == 'path' and set(found) == {ids['get-booking'], ids['delete-booking']}
+    assert lookup.exact("delete /bookings/{bookingId}", 'delete') == ('path', [ids['delete-booking']])
+    assert lookup.exact("/nowhere") == (None, [])
+
+def test_path_prefix_walks_the_trie(lookup, ids):
+    assert set(lookup.match_path_prefix("/bookings")) == {
+        ids['get-bookings'], ids['create-booking'], ids['get-booking'], ids['delete-booking'], ids['create-booking-payment']}
+    assert lookup.match_path_prefix("/bookings/{id}/payment") == [ids['create-booking-payment']]
+
+def test_candidates_from_tags_and_intent(lookup, ids):
+    candidate_ids, methods = lookup.candidates("list everything under tag:Stations", 'get')
+    assert candidate_ids == {ids['get-stations']}
+    assert methods == []
+    assert lookup.candidates('tag:"stations" or tag:Nowhere')[0] == {ids['get-stations']}
+    candidate_ids, methods = lookup.candidates("remove something", 'delete')
+    assert candidate_ids is None and methods == ['delete']
+
+def test_filter_string_parses_back(lookup, ids):
+    filter_string = lookup.filter_string("create a payment under /bookings", 'create')
+    groups = parse_filter(filter_string)
+    assert groups[0] == [('method', 'post')]
+    assert {value for _, value in groups[1]} >= {ids['create-booking'], ids['create-booking-payment']}
+    assert lookup.filter_string("tell me something") is None
+
+def test_large_candidate_sets_are_not_pushed_as_filters(lookup):
+    for i in range(MAX_FILTER_IDS + 1):
+        lookup.add_entry(f"extra-{i}", 'get', f"/bookings/extra{i}", '', [])
+    assert lookup.filter_string("anything under /bookings") is None
+
+def test_save_and_load(lookup, ids, tmp_path):
+    lookup.save(str(tmp_path / "lookup.json"))
+    loaded = EndpointLookup.load(str(tmp_path / "lookup.json"))
+    assert len(loaded) == len(lookup)
+    assert loaded.exact("create-booking") == ('operationId', [ids['create-booking']])
+    assert len(EndpointLookup.load(str(tmp_path / "missing.json"))) == 0
+
+def test_tag_words_do_not_exclude_the_answer(lookup, engine, ids):
+    # "bookings" names a tag, but the endpoint asked for is tagged Payments.
+    assert lookup.candidates("pay for the bookings") == (None, [])
+    _, apis = engine.search("pay for the bookings")
+    assert 'create-booking-payment' in [api['operationId'] for api in apis]
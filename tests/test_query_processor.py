@@ -0,0 +1,32 @@
+import pytest
+from query_processor import merge_hits, construct_api_chain, decompose_query, RRF_K
+
+def test_merge_hits_fuses_reciprocal_ranks():
+    merged = merge_hits([
+        [{'_id': 'a'}, {'_id': 'b'}, {'_id': 'c'}],
+        [{'_id': 'b'}, {'_id': 'd'}],
+    ], top_k=10)
+    assert [hit['_id'] for hit in merged] == ['b', 'a', 'd', 'c']
+    scores = {hit['_id']: hit['_fused_score'] for hit in merged}
+    assert scores['b'] == pytest.approx(1.0 / (RRF_K + 2) + 1.0 / (RRF_K + 1))
+    assert scores['a'] == pytest.approx(1.0 / (RRF_K + 1))
+
+def test_merge_hits_keeps_first_copy_and_top_k():
+    merged = merge_hits([
+        [{'_id': 'a', 'summary': 'first'}],
+        [{'_id': 'a', 'summary': 'second'}, {'_id': 'b'}],
+    ], top_k=1)
+    assert merged == [{'_id': 'a', 'summary': 'first', '_fused_score': pytest.approx(2.0 / (RRF_K + 1))}]
+
+def test_merge_hits_keys_hits_without_ids_by_operation():
+    hit = {'method': 'get', 'path': '/trips', 'operationId': 'get-trips'}
+    merged = merge_hits([[hit], [dict(hit)]], top_k=5, rrf_k=0)
+    assert len(merged) == 1
+    assert merged[0]['_fused_score'] == pytest.approx(2.0)
+
+def test_construct_api_chain_keeps_sub_query_order():
+    sub_queries = decompose_query("find trips and create a booking")
+    assert sub_queries == ["find trips", "find create a booking"]
+    chain = construct_api_chain(sub_queries, lambda query, index_name, n: [{'_id': query}], "endpoints", 5)
+    assert [step['sub_query'] for step in chain] == sub_queries
+    assert [step['relevant_apis'][0]['_id'] for step in chain] == sub_queries
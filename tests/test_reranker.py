@@ -0,0 +1,58 @@
+import pytest
+from reranker import Reranker, RERANK_WEIGHTS
+
+@pytest.fixture
+def reranker(train_travel_records):
+    reranker = Reranker()
+    for record in train_travel_records:
+        reranker.add(record)
+    reranker.build()
+    return reranker
+
+@pytest.fixture
+def ids(train_travel_records):
+    return {record.operation_id: record.id for record in train_travel_records}
+
+def hits(ids, *names):
+    # Search hits in the given order with equal scores, so only the features
+    # decide the re-ranked order.
+    return [{'_id': ids[name], '_score': 2.0, 'operationId': name} for name in names]
+
+def test_build_packs_one_row_per_endpoint(reranker, train_travel_records):
+    assert len(reranker) == len(train_travel_records)
+    assert reranker.features.shape == (len(train_travel_records), 3 * reranker.dim // 8)
+
+def test_intent_and_path_features_reorder_hits(reranker, ids):
+    ranked = reranker.rerank("delete a booking", hits(ids, 'get-booking', 'create-booking', 'delete-booking'), 3, 'delete')
+    assert ranked[0]['operationId'] == 'delete-booking'
+    ranked = reranker.rerank("pay for a booking", hits(ids, 'get-stations', 'create-booking-payment'), 2, 'create')
+    assert ranked[0]['operationId'] == 'create-booking-payment'
+    # "find ..." questions are not pushed towards GET endpoints.
+    candidates = hits(ids, 'get-trips', 'create-booking')
+    assert reranker.rerank("find book it", candidates, 2, 'get') == reranker.rerank("find book it", candidates, 2)
+
+def test_rerank_scores_and_truncates(reranker, ids):
+    ranked = reranker.rerank("list stations", hits(ids, 'get-trips', 'get-stations', 'get-bookings'), 2, 'get')
+    assert len(ranked) == 2
+    assert ranked[0]['operationId'] == 'get-stations'
+    assert ranked[0]['_search_score'] == 2.0
+    assert ranked[0]['_score'] >= ranked[1]['_score']
+    # Search score alone: best hit scores the first weight.
+    only_search = (1.0, 0.0, 0.0, 0.0, 0.0)
+    ranked = reranker.rerank("list stations", hits(ids, 'get-trips'), 1, 'get', weights=only_search)
+    assert ranked[0]['_score'] == pytest.approx(RERANK_WEIGHTS[0] * only_search[0])
+
+def test_unknown_hits_keep_only_their_search_score(reranker, ids):
+    ranked = reranker.rerank("list stations", [{'_id': 'elsewhere', '_score': 4.0}] + hits(ids, 'get-stations'), 2, 'get')
+    unknown = next(hit for hit in ranked if hit['_id'] == 'elsewhere')
+    assert unknown['_score'] == pytest.approx(RERANK_WEIGHTS[0])
+    assert Reranker().rerank("anything", [{'_id': 'a'}, {'_id': 'b'}], 1) == [{'_id': 'a'}]
+
+def test_save_and_load(reranker, ids, tmp_path):
+    path = str(tmp_path / "index.rerank.npz")
+    reranker.save(path)
+    loaded = Reranker.load(path)
+    assert loaded.ids == reranker.ids and loaded.state() == reranker.state()
+    candidates = hits(ids, 'get-booking', 'create-booking', 'delete-booking')
+    assert loaded.rerank("delete a booking", candidates, 3, 'delete') == reranker.rerank("delete a booking", candidates, 3, 'delete')
+    assert len(Reranker.load(str(tmp_path / "missing.npz"))) == 0
@@ -0,0 +1,132 @@
+import math
+import threading
+import pytest
+from search_backend import SearchBackend, LocalBackend, LocalIndex, Postings, parse_filter
+
+DOCUMENTS = [
+    {'_id': 'list-trips', 'summary': 'Get available train trips', 'operationId': 'get-trips', 'method': 'get'},
+    {'_id': 'create-booking', 'summary': 'Create a booking', 'operationId': 'create-booking', 'method': 'post'},
+    {'_id': 'list-bookings', 'summary': 'List existing bookings', 'operationId': 'get-bookings', 'method': 'get'},
+    {'_id': 'list-stations', 'summary': 'Get a list of train stations', 'operationId': 'get-stations', 'method': 'get'},
+]
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = LocalBackend(str(tmp_path / "index"))
+    backend.create_index("endpoints")
+    backend.add_documents("endpoints", DOCUMENTS)
+    return backend
+
+def test_search_backend_is_abstract():
+    with pytest.raises(TypeError):
+        SearchBackend()
+
+def test_bm25_score_matches_formula():
+    index = LocalIndex(["summary"])
+    index.documents = {'a': {'summary': 'train train station'}, 'b': {'summary': 'bus station'}}
+    hits = index.search("train", 10)
+    assert [hit['_id'] for hit in hits] == ['a']
+    # One of two documents holds the term twice; lengths are 3 and 2.
+    idf = math.log(1.0 + (2 - 1 + 0.5) / (1 + 0.5))
+    k1, b = Postings.k1, Postings.b
+    norm = k1 * (1.0 - b + b * 3 / 2.5)
+    assert hits[0]['_score'] == pytest.approx(idf * 2 * (k1 + 1.0) / (2 + norm), rel=1e-5)
+
+def test_search_ranks_and_limits(backend):
+    hits = backend.search("endpoints", "train stations", 2)
+    assert [hit['_id'] for hit in hits] == ['list-stations', 'list-trips']
+    assert hits[0]['_score'] > hits[1]['_score'] > 0
+    assert hits[0]['operationId'] == 'get-stations'
+    assert backend.search("endpoints", "unrelated words", 5) == []
+
+def test_search_applies_filter(backend):
+    hits = backend.search("endpoints", "bookings booking", 5, filter_string="(method:(post))")
+    assert [hit['_id'] for hit in hits] == ['create-booking']
+    hits = backend.search("endpoints", "get list", 5, filter_string="(method:(get)) AND (_id:(list-trips) OR _id:(list-stations))")
+    assert {hit['_id'] for hit in hits} == {'list-trips', 'list-stations'}
+
+def test_parse_filter_unescapes_values():
+    assert parse_filter(r"(method:(post)) AND (_id:(a\ b) OR tags:(x\(y\)))") == [
+        [('method', 'post')], [('_id', 'a b'), ('tags', 'x(y)')]]
+
+def test_writes_rebuild_postings(backend):
+    assert backend.search("endpoints", "refund", 5) == []
+    backend.add_documents("endpoints", [{'_id': 'refund', 'summary': 'Refund a booking'}])
+    assert backend.search("endpoints", "refund", 5)[0]['_id'] == 'refund'
+    backend.delete_documents("endpoints", ['refund'])
+    assert backend.search("endpoints", "refund", 5) == []
+
+def test_refresh_persists_index(backend, tmp_path):
+    expected = backend.search("endpoints", "train trips", 3)
+    backend.refresh("endpoints")
+    reloaded = LocalBackend(str(tmp_path / "index"))
+    assert reloaded.index_exists("endpoints")
+    assert reloaded.search("endpoints", "train trips", 3) == expected
+    assert reloaded.get_documents("endpoints", ['list-trips'])['list-trips']['summary'] == 'Get available train trips'
+
+def test_search_many_runs_concurrently_with_writes(backend):
+    errors = []
+
+    def write():
+        try:
+            for i in range(50):
+                backend.add_documents("endpoints", [{'_id': f'extra-{i}', 'summary': f'train extra {i}'}])
+        except Exception as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    for _ in range(20):
+        results = backend.search_many("endpoints", ["train", "booking", "stations"], 3)
+        assert len(results) == 3 and all(results)
+    writer.join()
+    assert not errors
+
+class FakeMarqo:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.bulk_calls = 0
+        self.index_name = None
+
+    def bulk_search(self, searches):
+        self.bulk_calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'result': [{'hits': [{'_id': search['q']}]} for search in searches]}
+
+    def index(self, index_name):
+        return self
+
+    def search(self, q, limit, filter_string=None):
+        return {'hits': [{'_id': f'single:{q}'}]}
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+def marqo_backend(errors):
+    from search_backend import MarqoBackend
+    backend = MarqoBackend.__new__(MarqoBackend)
+    backend.mq = FakeMarqo(errors)
+    backend.bulk_search_supported = True
+    return backend
+
+def test_bulk_search_disabled_on_missing_endpoint():
+    backend = marqo_backend([StatusError(404)])
+    assert backend.search_many("endpoints", ["a", "b"], 3) == [[{'_id': 'single:a'}], [{'_id': 'single:b'}]]
+    assert not backend.bulk_search_supported
+    backend.search_many("endpoints", ["a", "b"], 3)
+    assert backend.mq.bulk_calls == 1
+
+def test_bulk_search_retried_on_transient_error():
+    backend = marqo_backend([StatusError(503)])
+    assert backend.search_many("endpoints", ["a", "b"], 3) == [[{'_id': 'a'}], [{'_id': 'b'}]]
+    assert backend.bulk_search_supported
+    assert backend.mq.bulk_calls == 2
+
+def test_bulk_search_falls_back_once_and_stays_enabled():
+    backend = marqo_backend([ConnectionError("reset"), StatusError(500)])
+    assert backend.search_many("endpoints", ["a", "b"], 3) == [[{'_id': 'single:a'}], [{'_id': 'single:b'}]]
+    assert backend.bulk_search_supported
+    assert backend.search_many("endpoints", ["a", "b"], 3) == [[{'_id': 'a'}], [{'_id': 'b'}]]
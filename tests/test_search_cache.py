@@ -0,0 +1,38 @@
+import os
+import time
+from search_cache import SearchCache, cache_key
+
+def test_cache_key_covers_search_settings():
+    base = cache_key("Find  Trips", "get", 5, "1")
+    assert base == cache_key("find trips", "get", 5, "1")
+    assert len({base,
+                cache_key("find trips", "get", 5, "2"),
+                cache_key("find trips", "get", 5, "1", backend="local"),
+                cache_key("find trips", "get", 5, "1", shard_by="spec"),
+                cache_key("find trips", "get", 5, "1", reranker="1:256:42"),
+                cache_key("find trips", "get", 5, "1", filter_string="(method:(post))")}) == 6
+
+def test_cache_round_trip_and_ttl(tmp_path):
+    cache = SearchCache(ttl=60, path=str(tmp_path / "cache.sqlite"))
+    cache.put("k", [{'_id': 'a'}])
+    assert cache.get("k") == [{'_id': 'a'}]
+    reopened = SearchCache(ttl=60, path=str(tmp_path / "cache.sqlite"))
+    assert reopened.get("k") == [{'_id': 'a'}]
+    cache.entries["k"] = ([{'_id': 'a'}], time.time() - 120)
+    assert cache.get("k") is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_engine_key_follows_settings_and_other_processes(engine):
+    key = engine.search_cache_key("find trips", engine.index_name, 5)
+    engine.shard_by = "spec"
+    assert engine.search_cache_key("find trips", engine.index_name, 5) != key
+    engine.shard_by = "none"
+    assert engine.search_cache_key("find trips", engine.index_name, 5) == key
+    version = engine.index_version(engine.index_name)
+    # Another process bumping the version is seen without restarting.
+    path = os.path.join(".spec_cache", f"{engine.index_name}.version")
+    with open(path + ".other", 'w') as f:
+        f.write("other-process")
+    os.replace(path + ".other", path)
+    assert engine.index_version(engine.index_name) == "other-process" != version
+    assert engine.search_cache_key("find trips", engine.index_name, 5) != key
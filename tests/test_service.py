@@ -0,0 +1,58 @@
+import json
+import asyncio
+from service import QueryService
+
+class FakeEngine:
+    async def aplan(self, question, use_llm=True, cache_mode='use'):
+        if question == "fail":
+            raise RuntimeError("planning failed")
+        return {'question': question}
+
+    def stats(self):
+        return {'endpoints': 0}
+
+def request(service, raw):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await service.handle_request(reader)
+    return asyncio.run(run())
+
+def make_service():
+    async def create():
+        return QueryService(FakeEngine(), use_llm=False)
+    return asyncio.run(create())
+
+def test_query_request():
+    body = json.dumps({'question': "find trips"}).encode('utf-8')
+    status, payload = request(make_service(), b"POST /query HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+    assert status == 200 and payload == {'question': "find trips"}
+
+def test_invalid_content_length_is_bad_request():
+    for value in (b"abc", b"-5"):
+        status, payload = request(make_service(), b"POST /query HTTP/1.1\r\nContent-Length: " + value + b"\r\n\r\n")
+        assert status == 400 and 'Content-Length' in payload['error']
+
+def test_batch_reports_bad_lines_individually(tmp_path):
+    input_path = tmp_path / "questions.jsonl"
+    output_path = tmp_path / "results.jsonl"
+    input_path.write_text('\n'.join([
+        json.dumps({'question': "find trips", 'id': 1}),
+        json.dumps(42),
+        "not json",
+        json.dumps("book a trip"),
+        json.dumps({'question': "fail"}),
+        json.dumps({'id': 7}),
+    ]) + '\n')
+
+    async def run():
+        await QueryService(FakeEngine(), use_llm=False).run_batch(str(input_path), str(output_path))
+    asyncio.run(run())
+    results = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert results[0] == {'question': "find trips", 'id': 1}
+    assert results[1]['line'] == 2 and 'error' in results[1]
+    assert results[2]['line'] == 3 and results[2]['error'].startswith("invalid JSON")
+    assert results[3] == {'question': "book a trip"}
+    assert results[4] == {'question': "fail", 'error': "planning failed"}
+    assert results[5]['line'] == 6 and 'error' in results[5]
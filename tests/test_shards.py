@@ -0,0 +1,98 @@
+import os
+import shutil
+import pytest
+from conftest import ROOT
+from shards import ShardRouter, shard_index_name, shard_digest, group_documents, merge_by_score
+
+UISDK_SPEC = os.path.join(ROOT, "1uisdk-connect-api-Swagger-61.0.yaml")
+
+def documents(*names):
+    return [{'_id': name, 'fingerprint': f"fp-{name}", 'summary': name.replace('-', ' ')} for name in names]
+
+def test_route_prefers_shards_holding_the_query_terms():
+    router = ShardRouter()
+    router.update("trains", "trains", documents("list-trains", "book-train"), "a")
+    router.update("users", "users", documents("list-users", "delete-user"), "b")
+    router.update("tickets", "tickets", documents("print-ticket", "refund-ticket"), "c")
+    assert router.route("book a train") == ["trains"]
+    assert router.route("refund my ticket") == ["tickets"]
+    # Nothing tells the shards apart: every shard is searched.
+    assert sorted(router.route("hello")) == ["tickets", "trains", "users"]
+    assert router.shards_for(["book-train", "list-users", "gone"]) == {"trains": ["book-train"], "users": ["list-users"]}
+
+def test_remove_save_and_load(tmp_path):
+    router = ShardRouter("tag")
+    router.update("trains", "trains", documents("list-trains"), "a")
+    router.update("users", "users", documents("list-users"), "b")
+    router.remove("users")
+    router.save(str(tmp_path / "shards.json"))
+    loaded = ShardRouter.load(str(tmp_path / "shards.json"), "tag")
+    assert loaded.names() == ["trains"] and loaded.digest("trains") == "a"
+    assert loaded.shards_for(["list-users"]) == {}
+    # A router saved for another shard mode is not reused.
+    assert len(ShardRouter.load(str(tmp_path / "shards.json"), "spec")) == 0
+
+def test_names_digests_grouping_and_merge():
+    assert shard_index_name("api", "Train Travel") != shard_index_name("api", "train-travel")
+    assert shard_index_name("api", "Train Travel").startswith("api--train-travel-")
+    assert shard_digest(documents("a", "b")) == shard_digest(documents("b", "a"))
+    items = [("one.yaml", {'tags': 'Trains'}), ("two.yaml", {'tags': 'Users, Trains'}), ("two.yaml", {'tags': ''})]
+    assert {key: len(group) for key, group in group_documents(items, "tag")} == {'Trains': 1, 'Users': 1, 'untagged': 1}
+    assert [key for key, _ in group_documents(items, "spec")] == ["one", "two"]
+    merged = merge_by_score([[{'_score': 1.0}, {'_score': 0.2}], [{'_score': 0.5}]], 2)
+    assert [hit['_score'] for hit in merged] == [1.0, 0.5]
+
+@pytest.fixture
+def sharded(spec_dir, tmp_path, monkeypatch):
+    from engine import CopilotEngine
+    shutil.copy(UISDK_SPEC, spec_dir / "uisdk.yaml")
+    monkeypatch.chdir(tmp_path)
+
+    def start(mode='sync'):
+        engine = CopilotEngine(str(spec_dir), backend_name="local", shard_by="spec")
+        engine.load()
+        return engine, engine.prepare_index(mode)
+    return spec_dir, start
+
+def test_sharded_index_routes_and_syncs_per_spec(sharded):
+    spec_dir, start = sharded
+    engine, report = start()
+    assert report['shards'] == 2 and report['changed'] == 2
+    train_shard = shard_index_name(engine.index_name, "train-travel")
+    assert engine.router.route("trips between train stations")[0] == train_shard
+    _, apis = engine.search("find train trips")
+    assert any(api['operationId'] == 'get-trips' for api in apis)
+
+    # Nothing changed: no shard is re-indexed.
+    _, report = start()
+    assert report['changed'] == 0 and report['unchanged'] == 2
+
+    # Removing a spec deletes its shard only.
+    os.remove(spec_dir / "uisdk.yaml")
+    engine, report = start()
+    assert report['deleted'] == 1 and report['unchanged'] == 1
+    assert engine.router.names() == [train_shard]
+
+def test_failed_shard_is_synced_again(sharded, monkeypatch):
+    import engine as engine_module
+    from search_backend import LocalBackend
+    spec_dir, start = sharded
+    monkeypatch.setattr(engine_module, 'INGEST_RETRIES', 0)
+    add_documents = LocalBackend.add_documents
+
+    def failing(self, index_name, documents):
+        if "train-travel" in index_name:
+            raise ConnectionError("backend unavailable")
+        return add_documents(self, index_name, documents)
+    monkeypatch.setattr(LocalBackend, 'add_documents', failing)
+    engine, report = start()
+    train_shard = shard_index_name(engine.index_name, "train-travel")
+    assert report['changed'] == 2 and report['failed'] == 1
+    assert engine.router.digest(train_shard) is None
+
+    # Once the backend recovers, the failed shard is ingested again.
+    monkeypatch.setattr(LocalBackend, 'add_documents', add_documents)
+    engine, report = start()
+    assert report['changed'] == 1 and report['unchanged'] == 1 and report['failed'] == 0
+    _, apis = engine.search("list the trips between stations")
+    assert any(api['operationId'] == 'get-trips' for api in apis)
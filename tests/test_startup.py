@@ -0,0 +1,15 @@
+import sys
+import json
+import subprocess
+from conftest import ROOT
+from benchmark import STARTUP_FORBIDDEN
+
+SCRIPT = "import sys, json, main, service; print(json.dumps(sorted(sys.modules)))"
+
+def test_entry_points_import_no_heavy_dependencies():
+    output = subprocess.run([sys.executable, "-c", SCRIPT], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    loaded = set(json.loads(output.strip().splitlines()[-1]))
+    assert {"numpy", "marqo", "requests", "yaml"} <= set(STARTUP_FORBIDDEN)
+    assert sorted(module for module in STARTUP_FORBIDDEN if module in loaded) == []
+    assert "main" in loaded and "service" in loaded